@@ -4,107 +4,59 @@ main file for ddebug.
 import atexit
 import bdb
 import builtins
+import collections
 import datetime
 import functools
 import inspect
+import linecache
 import os
 import sys
+import threading
+import time
 import traceback
 from os import path
 from time import sleep
 from types import FrameType, FunctionType
 from typing import Any, Iterable, Literal, Optional, Sequence, Type, Union
 
-import icecream
-import snoop
-import snoop.configuration as snoop_configuration
-
 #
 from ddebug import dd_util as util
-from ddebug import richlib, watchlib
-
-
-class _IceCreamDebugger(icecream.IceCreamDebugger):
-    """
-    class for overwrite some icecream methods to make them match ddebug
-    """
-
-    def _formatArgs(self, callFrame, callNode, prefix, context, args):
-        """
-        copy of ic._formatArgs but with operators
-        """
-        source = icecream.Source.for_frame(callFrame)
-        try:
-            sanitizedArgStrs = [
-                source.get_text_with_indentation(arg)
-                for arg in callNode.args]
-        except AttributeError:  # callNode(type:BinOp) has no attribute 'args'
-            sanitizedArgStrs = [
-                source.get_text_with_indentation(callNode.parent)]
-
-        pairs = list(zip(sanitizedArgStrs, args))
-
-        out = self._constructArgumentOutput(prefix, context, pairs)
-        return out
-
-    def format_ic(self, callFrame, *args):
-        """
-        copy of ic.__call__ but getting callFrame.
-        """
-        try:
-            out = self._format(callFrame, *args)
-        except icecream.NoSourceAvailableError as err:
-            prefix = icecream.callOrValue(self.prefix)
-            out = prefix + 'Error: ' + err.infoMessage
-        self.outputFunction(out)
-
-    def print_class_call(self, name, cls_name, callFrame):
-        """
-        print class call for dd.mincls
-        """
-        if self.enabled:
-            prefix = icecream.callOrValue(self.prefix)
-            executing = icecream.Source.executing(callFrame)
-            callNode = executing.node
-            if callNode is None:
-                self.outputFunction(
-                    f"error NoSourceAvailableError(Failed to access the underlying source code for analysis) :call "
-                    f"method '{name}' from class '{cls_name}'")
-                return
-
-            context = self._formatContext(callFrame, callNode)
-
-            # context = context.split(" at ")
-            #
-            time = self._formatTime()
-            out = prefix + context + f": call method '{name}' from class '{cls_name}'" + time
-            self.outputFunction(out)
+from ddebug import jsonlib, profilelib, tracelib, watchlib
 
-    @property
-    def stream(self):
-        """
-        Get/Set icecream stream
-        """
-        if hasattr(self, "_file"):
-            return self._file
-        return sys.stderr
 
-    @stream.setter
-    def stream(self, value):
-        self._file = value  # noqa
-        if value != sys.stderr:
-            self.outputFunction = self._output_txt
-        else:
-            self.outputFunction = icecream.DEFAULT_OUTPUT_FUNCTION
+_snoop_options = {}
+"""
+snoop config values to set when snoop is imported
+"""
+_snoop_tag_records = False
 
-    def _output_txt(self, s):
-        self._streamPrint(s)
 
-    def _streamPrint(self, *args):
-        file = sys.stderr
-        if hasattr(self, "_file"):
-            file = self._file
-        print(*args, file=file)
+def _import_snoop():
+    """
+    import snoop (on first use) and apply the snoop config values that was set before that.
+    """
+    global _snoop_tag_records
+    import snoop
+    import snoop.configuration as snoop_configuration
+    _snoop_tag_records = _snoop_options.pop("tag_records", _snoop_tag_records)
+    config = snoop.snoop.config
+    for name, value in _snoop_options.items():
+        if name == "write":
+            value = snoop_configuration.get_write_function(output=value, overwrite=False)
+        setattr(config, name, value)
+    _snoop_options.clear()
+    write = getattr(config.write, "__wrapped__", config.write)
+    config.write = util.tagged_write(write) if _snoop_tag_records else write
+    return snoop
+
+
+def _set_snoop_config(name: str, value) -> None:
+    """
+    set snoop config value now if snoop is imported, else when it will be imported
+    """
+    _snoop_options[name] = value
+    if "snoop" in sys.modules:
+        _import_snoop()
 
 
 def set_snoop_write(output) -> None:
@@ -116,7 +68,24 @@ def set_snoop_write(output) -> None:
         None
 
     """
-    snoop.snoop.config.write = snoop_configuration.get_write_function(output=output, overwrite=False)
+    _set_snoop_config("write", output)
+
+
+def _async_stream(stream, async_write: Union[bool, dict]):
+    """
+    wrap stream with util.AsyncWriter if async_write
+
+    Args:
+        stream: the stream
+        async_write (Union[bool,dict]): False,True or dict of `util.AsyncWriter` arguments
+
+    Returns:
+        the stream or util.AsyncWriter that write to the stream
+    """
+    if not async_write:
+        return stream
+    options = async_write if isinstance(async_write, dict) else {}
+    return util.AsyncWriter(stream, **options)
 
 
 def _first(mlist: Sequence) -> Optional[Union[Any, str]]:
@@ -136,8 +105,8 @@ def _first(mlist: Sequence) -> Optional[Union[Any, str]]:
 
 class ClsDebugger:
 
-    def __init__(self, rich_color_system: richlib.Optional[
-        richlib.Literal["auto", "standard", "256", "truecolor", "windows"]
+    def __init__(self, rich_color_system: Optional[
+        Literal["auto", "standard", "256", "truecolor", "windows"]
     ] = "auto", ):
         """
         main class for ddebug.
@@ -145,71 +114,239 @@ class ClsDebugger:
         Args:
             rich_color_system (str): rich color system. can be  auto,standard,256,truecolor or windows. see https://rich.readthedocs.io/en/stable/console.html#color-systems
         """
-        # snoop
-        self._self_snoop = snoop.snoop()
-        self.deep = snoop.pp.deep
+        # snoop is imported on first use (see `_self_snoop`)
+        self._snoop_enabled = True
+        self.ssc = self.snoop_short_config
+        """
+        shortcut for `dd.snoop_short_config`
+        """
+        # rich and icecream are created on first use (see `_console` and `_ic`)
+        self._rich_color_system = rich_color_system
+        self._lazy_options = {"_console": {}, "_ic": {}}
+        self.exc = util.Exc(self)
+        """
+        shortcut for all `print_exception` types - can use as `print_exception`,`log_error` and `log_error_function`.
+        """
+        self.profile = profilelib.Profile(self)
+        """
+        statistical profiler - use as `@dd.profile`,`with dd.profile` or `@dd.profile(interval=0.01,collapsed_file="stacks.txt")`.
+        print rich tree of the hottest call paths.
+        """
+        # more
+        self.mc = self.mincls
+        """
+        shortcut for `dd.mincls`
+        """
+        self._sample_summary_registered = False
+        self._mincls_buffer = collections.deque(maxlen=10000)
+        self._trace_recorder: Optional[tracelib.TraceRecorder] = None
+        self._json_sink: Optional[jsonlib.JsonSink] = None
+        self._flight_recorder = None
+        self._flight_dump_last = 100
+        self._with_local = threading.local()
+        """ the `with dd` tracers of every thread """
+        self._call_stats: Optional[dict] = None
+        self._stats_with_print = False
+
+    @functools.cached_property
+    def _self_snoop(self) -> "snoop.snoop":
+        """
+        the snoop object. snoop is imported on first use
+        """
+        return _import_snoop().snoop()
+
+    @property
+    def deep(self):
         """
         copy from snoop.pp.deep; can trace subexpressions.see https://github.com/alexmojaki/snoop#ppdeep-for-tracing-subexpressions
         """
-        self.ssc = self.snoop_short_config
+        return _import_snoop().pp.deep
+
+    @functools.cached_property
+    def _console(self) -> "richlib.Console":
         """
-        shortcut for `dd.snoop_short_config`
+        the rich console. rich is imported on first use
         """
-        # rich
-        self._console = richlib.Console(color_system=rich_color_system)
-        self._ic = _IceCreamDebugger(prefix="dd| ")
-        # rich errors
-        self.print_exception = self._console.print_exception
+        from ddebug import richlib
+        console = richlib.Console(color_system=self._rich_color_system)
+        for name, value in self._lazy_options.pop("_console").items():
+            setattr(console, name, value)
+        return console
+
+    @functools.cached_property
+    def _ic(self) -> "iclib.IceCreamDebugger":
+        """
+        the icecream debugger. icecream is imported on first use
         """
-        function for print exception (with rich and friendly) in rich after the exception rises """
-        self.log_error = self.except_error = self._console.logerror
+        from ddebug import iclib
+        ic = iclib.IceCreamDebugger(prefix="dd| ")
+        for name, value in self._lazy_options.pop("_ic").items():
+            setattr(ic, name, value)
+        return ic
 
+    @property
+    def _ic_enabled(self) -> bool:
         """
-        contextmanager for print exception if exception raises in with block
+        enabled of `_ic` - without creating it
         """
-        self.log_error_function = self.except_error_function = self._console.logerror_function
+        ic = self.__dict__.get("_ic")
+        if ic is None:
+            return self._lazy_options["_ic"].get("enabled", True)
+        return ic.enabled
+
+    def _set_lazy(self, obj_name: str, name: str, value):
         """
-        function wrapper for print exception if exception raises in the function
+        set attribute of `_console` or `_ic` without creating it
+
+        Args:
+            obj_name (str): "_console" or "_ic"
+            name (str): the attribute name
+            value: the attribute value
         """
-        self.exc = util.Exc(self)
+        if obj_name in self.__dict__:  # already created
+            setattr(self.__dict__[obj_name], name, value)
+        else:
+            self._lazy_options[obj_name][name] = value
+
+    @property
+    def call_sites(self) -> util.LRUCache:
         """
-        shortcut for all `print_exception` types - can use as `print_exception`,`log_error` and `log_error_function`.
+        LRU cache of the dd() call sites source analysis. use `dd.call_sites.cache_info()` for statistics
+        """
+        return self._ic.call_sites
+
+    # rich errors
+    @property
+    def print_exception(self):
+        """
+        function for print exception (with rich and friendly) in rich after the exception rises
         """
-        # rich tools
-        self.pprint = self._console.pprint
+        return self._console.print_exception
+
+    @property
+    def log_error(self):
+        """
+        contextmanager for print exception if exception raises in with block
+        """
+        return self._console.logerror
+
+    except_error = log_error
+
+    @property
+    def log_error_function(self):
+        """
+        function wrapper for print exception if exception raises in the function
+        """
+        return self._console.logerror_function
+
+    except_error_function = log_error_function
+
+    # rich tools
+    @property
+    def pprint(self):
         """
         function for rich pretty print value
         """
-        self.inspect = self._console.inspect
+        return self._console.pprint
+
+    @property
+    def inspect(self):
         """
         function for rich.inspect - Inspect any Python object.see https://rich.readthedocs.io/en/stable/introduction.html#rich-inspect
+        the reprs are bounded (max_items,max_string,max_depth,time_budget) and `include` filter the attributes.
         """
-        self.diff = self._console.diff
+        return self._console.inspect
+
+    @property
+    def diff(self):
         """
         function for pretty print of DeepDiff with rich
         """
-        self.locals = self._console.locals
+        return self._console.diff
+
+    @property
+    def locals(self):
         """
-        function for pretty print all locals with rich
+        function for pretty print all locals with rich. the reprs are bounded (max_items,max_string,max_depth,time_budget)
+        and `include` filter the names.
         """
-        self.time = self.timeit = self._console.timeit
-        # watch
-        self.w = self.watch = watchlib.watch.__call__
+        return self._console.locals
+
+    @property
+    def timeit(self):
         """
-        shortcut for watchlib.watch
+        function wrapper for run the function in loop and print the time statistics (min,median,stdev,ops/s)
         """
-        self.unw = self.unwatch = watchlib.watch.unwatch
+        return self._console.timeit
+
+    time = timeit
+
+    @property
+    def timeit_history(self) -> Optional[str]:
         """
-        shortcut for watchlib.unwatch
+        Get/Set the JSON Lines file for `dd.timeit` results. when it set, every `dd.timeit` compare the result to the
+        baseline (the first result of the function and label) and flag regressions above `dd.timeit_threshold`.
         """
-        # more
-        self.mc = self.mincls
+        return self._console.timeit_history
+
+    @timeit_history.setter
+    def timeit_history(self, value: Optional[str]):
+        self._set_lazy("_console", "timeit_history", value)
+
+    @property
+    def timeit_threshold(self) -> float:
         """
-        shortcut for `dd.mincls`
+        Get/Set the relative slowdown that `dd.timeit` flag as regression. Defaults to 0.1 (10%)
         """
+        return self._console.timeit_threshold
 
-    @staticmethod
-    def _get_call_type(first, frame: FrameType) -> str:
+    @timeit_threshold.setter
+    def timeit_threshold(self, value: float):
+        self._set_lazy("_console", "timeit_threshold", value)
+
+    @property
+    def tag_records(self) -> bool:
+        """
+        Get/Set if every `dd()`,`@dd.mincls` and `@dd` record is prefixed with the thread (and asyncio task) name.
+        Defaults to False
+        """
+        if "_ic" not in self.__dict__:
+            return self._lazy_options["_ic"].get("tag_records", False)
+        return self._ic.tag_records
+
+    @tag_records.setter
+    def tag_records(self, value: bool):
+        self._set_lazy("_ic", "tag_records", value)
+        _set_snoop_config("tag_records", value)
+
+    @property
+    def timeit_compare(self):
+        """
+        function for timeit some functions (with the same arguments) and print rich table that compare them
+        """
+        return self._console.timeit_compare
+
+    # watch
+    @property
+    def watch(self):
+        """
+        watch variables, attributes, items and objects and print every change (see watchlib.Watcher).
+        options that only watchpoints.watch has (e.g. track,stack_limit) use watchpoints.
+        """
+        return watchlib.get_watcher().__call__
+
+    w = watch
+
+    @property
+    def unwatch(self):
+        """
+        stop watching the arguments (objects or aliases), or everything if there are no arguments
+        """
+        return watchlib.get_watcher().unwatch
+
+    unw = unwatch
+
+    def _get_call_type(self, first, frame: FrameType) -> str:
         """
         find @dd or dd()
 
@@ -220,17 +357,9 @@ class ClsDebugger:
         Returns: () or @
 
         """
-        # find @dd
-        code_context = inspect.getframeinfo(frame).code_context
-        call_type = "()"
-        if code_context:
-            code_context = code_context[0].strip()
-
-            #####################################
-            if callable(first):
-                if code_context.startswith(("def", "class")):  # @dd
-                    call_type = "@"
-        return call_type
+        if callable(first):
+            return self._ic.call_site(frame).call_type
+        return "()"
 
     def __call__(self, *args, call_type: Optional[Literal["@", "()"]] = None, _from_frame=None) -> Union[
             str, tuple, FunctionType]:
@@ -250,6 +379,10 @@ class ClsDebugger:
 
         """
 
+        if not (self._ic_enabled or self._snoop_enabled) and not (len(args) == 1 and callable(args[0])):
+            # disabled: no frame inspection at all. a callable is checked for `@dd` - so the function is traced
+            # after dd is enabled again
+            return args[0] if len(args) == 1 else args
         first = _first(args)
         if _from_frame is None:
             _from_frame = inspect.currentframe()
@@ -261,11 +394,119 @@ class ClsDebugger:
         if call_type == "@":
             return self.process_snoop(first)
         #
-        if self._ic.enabled:  # and not return yet
+        if self._ic_enabled:  # and not return yet
+            if self._call_stats is not None:
+                self._add_call_stats(_from_frame, args)
+                if not self._stats_with_print:
+                    return self._return_args(args)
             self._ic.format_ic(_from_frame, *args)
             #
         return self._return_args(args)
 
+    def _add_call_stats(self, frame: FrameType, args: tuple):
+        key = (frame.f_code, frame.f_lasti)
+        site_stats = self._call_stats.get(key)
+        if site_stats is None:
+            site = self._ic.call_site(frame)
+            location = site.context or f"{path.basename(frame.f_code.co_filename)}:{frame.f_lineno}"
+            site_stats = self._call_stats[key] = util.CallSiteStats(location, site.arg_names)
+        site_stats.add(args)
+
+    def collect_stats(self, enabled: bool = True, with_print: bool = False):
+        """
+        aggregate dd() calls to per call site counters (hits,first/last time and min/max/mean of numeric arguments).
+        print the counters with `dd.stats()`.
+
+        Args:
+            enabled (bool): if False stop collecting. Defaults to True
+            with_print (bool): if True dd() also print as usual. Defaults to False
+
+        Returns:
+            ClsDebugger:the ClsDebugger object (dd)
+        """
+        self._call_stats = {} if enabled else None
+        self._stats_with_print = with_print
+        return self
+
+    def limit_reprs(self, enabled: bool = True, max_items: int = 100, max_string: int = 1000, max_depth: int = 6):
+        """
+        limit the reprs of the values printed by `dd()`. the limits are applied while the repr is generated,
+        so `dd(huge_value)` cost O(limits). NumPy arrays, pandas objects, bytes and big mappings are summarized.
+        the limits are on by default with the default arguments.
+
+        Args:
+            enabled (bool): if False print the full reprs. Defaults to True
+            max_items (int): max items of every container. Defaults to 100
+            max_string (int): max length of strings,bytes and repr of other objects. Defaults to 1000
+            max_depth (int): max depth of nested containers. Defaults to 6
+
+        Returns:
+            ClsDebugger:the ClsDebugger object (dd)
+        """
+        limits = None
+        if enabled:
+            from ddebug import limitlib
+            limits = limitlib.LimitedRepr(max_items=max_items, max_string=max_string, max_depth=max_depth)
+        self._set_lazy("_ic", "repr_limits", limits)
+        return self
+
+    def fast_exceptions(self, enabled: bool = True, background: bool = False):
+        """
+        make `dd.exc`,`dd.print_exception`,`dd.log_error` and `dd.log_error_function` cheap for repeated errors:
+        the rich traceback and the friendly explanation are printed only for the first occurrence of every
+        exception type and traceback locations, later occurrences get plain (stdlib) traceback.
+
+        Args:
+            enabled (bool): if False always print the rich traceback and friendly explanation. Defaults to True
+            background (bool): print plain traceback for the first occurrence too, and render the rich traceback
+             and friendly explanation in background thread. Defaults to False
+
+        Returns:
+            ClsDebugger:the ClsDebugger object (dd)
+        """
+        self._set_lazy("_console", "fast_exceptions", enabled)
+        self._set_lazy("_console", "background_exceptions", background)
+        return self
+
+    def dedup_exceptions(self, enabled: bool = True):
+        """
+        print only the first occurrence of every exception (type and traceback locations) in `dd.exc`,
+        `dd.print_exception`,`dd.log_error`,`dd.log_error_function` and the excepthooks - the rest are only counted.
+        see the counts with `dd.error_summary()`.
+
+        Args:
+            enabled (bool): if False print every exception. Defaults to True
+
+        Returns:
+            ClsDebugger:the ClsDebugger object (dd)
+        """
+        self._set_lazy("_console", "dedup_exceptions", enabled)
+        return self
+
+    def error_summary(self, clear: bool = False):
+        """
+        print rich table of the exceptions printed (or counted) by ddebug - count, first/last time and sample messages
+        of every exception type and traceback locations. the exceptions are counted only after
+        `dd.dedup_exceptions()` or `dd.fast_exceptions()`
+
+        Args:
+            clear (bool): if True reset the counters. Defaults to False
+        """
+        self._console.error_summary()
+        if clear:
+            self._console.error_stats.clear()
+
+    def stats(self, clear: bool = False):
+        """
+        print rich table of the counters collected after `dd.collect_stats()`
+
+        Args:
+            clear (bool): if True reset the counters. Defaults to False
+        """
+        self._console.stats(self._call_stats or {})
+        if clear and self._call_stats is not None:
+            self._call_stats.clear()
+
     def process_snoop(self, fnc: Union[FunctionType, Type]) -> Union[FunctionType, Type]:
         """
         append @snoop to function or @snoop to all functions in class
@@ -277,14 +518,141 @@ class ClsDebugger:
             Union[FunctionType,Type]: the class or the function with @snoop
 
         """
+        tracer = self._snoop_tracer
         if inspect.isclass(fnc):
             for func in inspect.getmembers(fnc, predicate=inspect.isfunction):
                 real_func = func[1]
                 #
-                setattr(fnc, func[0], self._self_snoop(real_func))
+                setattr(fnc, func[0], self._trace_function(tracer, real_func))
             return fnc
         else:
-            return self._self_snoop(fnc)
+            return self._trace_function(tracer, fnc)
+
+    @staticmethod
+    def _trace_function(tracer, func: FunctionType) -> FunctionType:
+        """
+        tracer(func), but also for `async def` functions (snoop does not support coroutines)
+        """
+        if isinstance(tracer, tracelib.TraceRecorder) or not tracelib.is_async_function(func):
+            return tracer(func)
+        # follow every await point of the coroutine with the snoop trace function
+        tracer.target_codes.add(func.__code__)
+
+        def trace(frame, event, arg):
+            # the first `call` event of coroutine is on the decorator line, and snoop look for `def` after it
+            # (not `async def`) - so report the call on the first line of the body.
+            if event == "call" and frame.f_code is func.__code__ and \
+                    linecache.getline(frame.f_code.co_filename, frame.f_lineno).lstrip().startswith("@"):
+                def first_line_trace(first_frame, first_event, first_arg):
+                    tracer.trace(first_frame, "call", None)  # print the first line too
+                    if first_event == "line":
+                        return trace
+                    return trace(first_frame, first_event, first_arg)
+
+                return first_line_trace
+            if frame.f_code is not func.__code__:
+                return tracer.trace(frame, event, arg)
+            if not (event == "exception" and arg[0] is StopIteration):  # the awaited object finished - not error
+                tracer.trace(frame, event, arg)
+            return trace
+
+        trace_step = tracelib.traced_step(trace)
+
+        def step(method, value):
+            if not tracer.config.enabled:
+                return method(value)
+            tracer.config.thread_local.__dict__.setdefault('depth', -1)
+            return trace_step(method, value)
+
+        return tracelib.wrap_async(func, step)
+
+    @property
+    def _snoop_tracer(self) -> Union["snoop.snoop", tracelib.TraceRecorder]:
+        """
+        the trace recorder if `dd.record_trace` is on, else snoop
+        """
+        if self._trace_recorder is not None:
+            return self._trace_recorder
+        return self._self_snoop
+
+    def record_trace(self, file: Optional[str] = "ddebug-trace.ddt") -> Optional[str]:
+        """
+        record `@dd` and `with dd` into a compact binary trace file instead of print the snoop output.
+        the file can be rendered later (like snoop) with `python -m ddebug.replay <file>`.
+
+        Args:
+            file (Optional[str]): the trace file name. pass None to stop recording. Defaults to "ddebug-trace.ddt"
+
+        Returns:
+            Optional[str]: the trace file name
+        """
+        if self._trace_recorder is not None:
+            self._trace_recorder.close()
+            self._trace_recorder = None
+        if file is not None:
+            self._trace_recorder = tracelib.TraceRecorder(file)
+            self._trace_recorder.enabled = self._snoop_enabled
+            atexit.register(self._trace_recorder.close)
+        return file
+
+    def json_output(self, file: Optional[str] = "ddebug.jsonl") -> Optional[str]:
+        """
+        write every event - `dd()` and `@dd.mincls` calls, watch triggers, `@dd`/`with dd` trace events and exceptions -
+        as one JSON object per line (with time,location,thread and values) instead of printing it.
+        call before decorating the functions with `@dd`. an active `dd.record_trace` file is closed.
+
+        Args:
+            file (Optional[str]): the JSON Lines file name. pass None to print again. Defaults to "ddebug.jsonl"
+
+        Returns:
+            Optional[str]: the JSON Lines file name
+        """
+        if self._json_sink is not None:
+            self._json_sink.close()
+            if isinstance(self._trace_recorder, jsonlib.JsonTraceRecorder):
+                self._trace_recorder = None
+        sink = None if file is None else jsonlib.JsonSink(file)
+        self._json_sink = sink
+        self._set_lazy("_ic", "json_sink", sink)
+        self._set_lazy("_console", "json_sink", sink)
+        watchlib.json_sink = sink
+        if sink is not None:
+            if self._trace_recorder is not None:  # replaces dd.record_trace - flush and close its file
+                self._trace_recorder.close()
+            self._trace_recorder = jsonlib.JsonTraceRecorder(sink)
+            self._trace_recorder.enabled = self._snoop_enabled
+            atexit.register(sink.close)
+        return file
+
+    def flight_recorder(self, size_mb: Optional[float] = 1, file: str = "ddebug-flight.ddf",
+                        dump_last: int = 100, backup_count: int = 5) -> Optional[str]:
+        """
+        record `dd()`,`@dd.mincls` and watch events into a memory-mapped circular file instead of printing them.
+        the hooks of `dd.set_excepthook`/`dd.set_atexit` print the last events after the exception.
+        the file survives hard kills - print it with `python -m ddebug.flightlib <file>`. an existing file (e.g. of
+        the run that just crashed) is kept as `<name>.<date-time><ext>`.
+
+        Args:
+            size_mb (Optional[float]): size of the circular file in MB. pass None to stop recording. Defaults to 1
+            file (str): the file name. Defaults to "ddebug-flight.ddf"
+            dump_last (int): number of events to print after exception. Defaults to 100
+            backup_count (int): number of previous files to keep. Defaults to 5
+
+        Returns:
+            Optional[str]: the file name
+        """
+        from ddebug import flightlib
+        if self._flight_recorder is not None:
+            self._flight_recorder.close()
+        recorder = None if size_mb is None else flightlib.FlightRecorder(file, int(size_mb * (1 << 20)),
+                                                                          backup_count)
+        self._flight_recorder = recorder
+        self._flight_dump_last = dump_last
+        self._set_lazy("_ic", "flight_recorder", recorder)
+        watchlib.flight_recorder = recorder
+        if recorder is not None:
+            atexit.register(recorder.close)
+        return None if recorder is None else file
 
     @staticmethod
     def _return_args(args: Sequence) -> Union[Sequence, Any]:
@@ -302,29 +670,79 @@ class ClsDebugger:
         else:
             return args
 
-    def mincls(self, l: Type) -> Type:
+    def mincls(self, l: Type = None, light: bool = False) -> Union[Type, FunctionType]:
         """
         process class for see the functions call
 
         Args:
             l (Type): the class
+            light (bool): if True only record the calls (class,method,caller code location and time) in a ring buffer
+             without any frame inspection. print them later with `dd.dump_mincls()`. Defaults to False
 
         Returns:
-            the class with the mincls wrapper
+            the class with the mincls wrapper (or the mincls decorator if l is None)
         """
-        for func in inspect.getmembers(l, predicate=inspect.isfunction):
-            if func[0].startswith("_"):
+        if l is None:
+            return functools.partial(self.mincls, light=light)
+        for name, real_func in inspect.getmembers(l, predicate=inspect.isfunction):
+            if name.startswith("_"):
                 continue
+            if light:
+                wrapper = self._mincls_light_wrapper(name, l.__name__, real_func)
+            else:
+                wrapper = self._mincls_wrapper(name, l.__name__, real_func)
+            setattr(l, name, wrapper)
+        return l
 
-            real_func = func[1]
+    def _mincls_wrapper(self, name: str, cls_name: str, real_func: FunctionType) -> FunctionType:
+        @functools.wraps(real_func)
+        def wrapper(*args, **kwargs):
+            self._ic.print_class_call(name, cls_name, inspect.currentframe().f_back)
+            return real_func(*args, **kwargs)
 
-            @functools.wraps(real_func)
-            def wrapper(*args, **kwargs):
-                self._ic.print_class_call(func[0], l.__name__, inspect.currentframe().f_back)
-                return real_func(*args, **kwargs)
+        return wrapper
 
-            setattr(l, func[0], wrapper)
-        return l
+    def _mincls_light_wrapper(self, name: str, cls_name: str, real_func: FunctionType) -> FunctionType:
+        @functools.wraps(real_func)
+        def wrapper(*args, **kwargs):
+            if self._ic.enabled:
+                frame = sys._getframe(1)  # noqa
+                self._mincls_buffer.append((time.time(), cls_name, name, frame.f_code, frame.f_lineno))
+            return real_func(*args, **kwargs)
+
+        return wrapper
+
+    @property
+    def mincls_buffer_size(self) -> int:
+        """
+        Get/Set the size of the `dd.mincls(light=True)` ring buffer (the oldest calls are dropped when it is full).
+        """
+        return self._mincls_buffer.maxlen
+
+    @mincls_buffer_size.setter
+    def mincls_buffer_size(self, value: int):
+        self._mincls_buffer = collections.deque(self._mincls_buffer, maxlen=value)
+
+    def dump_mincls(self, clear: bool = True) -> None:
+        """
+        print the calls recorded by `dd.mincls(light=True)`
+
+        Args:
+            clear (bool): if True remove the printed calls from the buffer. Defaults to True
+        """
+        locations = {}
+        for timestamp, cls_name, name, code, line in list(self._mincls_buffer):
+            location = locations.get(code)
+            if location is None:
+                parent_function = code.co_name
+                if parent_function != '<module>':
+                    parent_function = f"{parent_function}()"
+                location = locations[code] = (os.path.basename(code.co_filename), parent_function)
+            time_string = datetime.datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3]
+            self._ic.output(
+                f"{location[0]}:{line} in {location[1]}: call method '{name}' from class '{cls_name}' at {time_string}")
+        if clear:
+            self._mincls_buffer.clear()
 
     @staticmethod
     def breakpoint():
@@ -356,25 +774,37 @@ class ClsDebugger:
         return self
 
     # # # #
-    def print_stack(self, block: int = None, context=1):
+    def print_stack(self, block: int = None, context=1, compact: bool = False):
         """
-        print the inspect.stack with rich
+        print the stack with rich. only the printed frames are visited (by `frame.f_back`) and their source is read
+        lazily, so it is cheap also in deep stacks.
 
         Args:
             block: block after X
-            context:context value for `inspect.stack` function
-        """
-        stack = inspect.stack(context)[1:]
-
-        self._console.dd_format_frames(stack, block)
+            context: number of source lines around the line of every frame (like `inspect.stack(context)`).
+             if 1 the executing statement is printed. not used if compact. Defaults to 1
+            compact (bool): print one line (location and source line) per frame. Defaults to False
+        """
+        frames = []
+        frame = sys._getframe(1)  # noqa
+        while frame is not None and (not block or len(frames) < block):
+            frames.append(frame)
+            frame = frame.f_back
+        del frame
+        self._console.dd_format_frames(frames, compact=compact, context=context)
 
     ##
-    def add_tmp_stream(self, with_print=True) -> str:
+    def add_tmp_stream(self, with_print=True, async_write: Union[bool, dict] = False,
+                       rotate: Optional[dict] = None) -> str:
         """
         add/set ddebug stream to tmp file named `ddebug.txt`.
 
         Args:
             with_print (bool): if True the tmp file write in addition to the stdout
+            async_write (Union[bool,dict]): if True write in a background thread (see `util.AsyncWriter`).
+             can be a dict of `util.AsyncWriter` arguments (max_queue,overflow,batch_size). Defaults to False
+            rotate (Optional[dict]): rotate the file (instead of overwrite it). dict of `util.RotatingFile` arguments
+             (max_bytes,interval,backup_count,compress). Defaults to None
 
         Returns:
             str:the tmp file name
@@ -382,15 +812,17 @@ class ClsDebugger:
         tmp_output_dir = (os.environ.get('TMPDIR', '') or os.environ.get('TEMP', '') or '/tmp')
         tmp_output = os.path.join(tmp_output_dir, "ddebug.txt")
         if with_print:
-            self.stream = util.Logger(open(tmp_output, "w"), self.stream)
+            stream = util.Logger(util.open_log(tmp_output, rotate), self.stream)
         else:
-            self.stream = open(tmp_output, "w")
+            stream = util.open_log(tmp_output, rotate)
+        self.stream = _async_stream(stream, async_write)
         atexit.register(self.stream.close)
         return tmp_output
 
     ####
     def add_output_folder(self, with_date: bool = False, with_errors: bool = True, pyfile: str = None,
-                          folder: str = None) -> str:
+                          folder: str = None, async_write: Union[bool, dict] = False, per_thread: bool = False,
+                          structured: bool = False, rotate: Optional[dict] = None) -> str:
         """
         set ddebug stream to the normal std plus output folder (named the main script name) with 4 txt file:
 
@@ -407,6 +839,14 @@ class ClsDebugger:
             with_errors: if False it prevent create excepthook or atexit. Defaults to True
             pyfile: the python file to prevent the auto detect. Defaults to None
             folder: the name of the output folder.Defaults to None
+            async_write: if True write the logs in a background thread (see `util.AsyncWriter`).
+             can be a dict of `util.AsyncWriter` arguments (max_queue,overflow,batch_size). Defaults to False
+            per_thread: if True every thread also write to its own files (e.g. `icecream-MainThread-log.txt`), and
+             the records are tagged with the thread name (see `dd.tag_records`). Defaults to False
+            structured: if True write all the events to `events.jsonl` in the folder instead of the txt logs
+             (see `dd.json_output`). Defaults to False
+            rotate: rotate the txt logs by size or time. dict of `util.RotatingFile` arguments
+             (max_bytes,interval,backup_count,compress). Defaults to None
 
         Returns:
             str: the output folder name
@@ -426,14 +866,21 @@ class ClsDebugger:
         #
 
         def add_stream(name, std):
-            st = open(path.join(folder, f"{name}-log.txt"), "w")
+            st = _async_stream(util.Logger(util.open_log(path.join(folder, f"{name}-log.txt"), rotate), std),
+                               async_write)
+            if per_thread:  # the thread files are written by the thread itself (not by the AsyncWriter thread)
+                st = util.ThreadFiles(path.join(folder, f"{name}-{{thread}}-log.txt"), st)
             atexit.register(st.close)
-            return util.Logger(st, std)
+            return st
 
-        self._ic.stream = add_stream("icecream", sys.stderr)
+        self._set_lazy("_ic", "stream", add_stream("icecream", sys.stderr))
         self.watch_stream = add_stream("watch", sys.stderr)
         set_snoop_write(add_stream("snoop", sys.stderr))
-        self._console.file = add_stream("rich", sys.stdout)
+        self._set_lazy("_console", "file", add_stream("rich", sys.stdout))
+        if per_thread:
+            self.tag_records = True
+        if structured:
+            self.json_output(path.join(folder, "events.jsonl"))
         if with_errors:
             efile = os.path.join(folder, "error")
             if sys.excepthook == sys.__excepthook__:  # sys.excepthook not change
@@ -442,6 +889,44 @@ class ClsDebugger:
                 self.set_atexit(file=efile, pattern="{}.txt")
         return folder
 
+    def sample(self, every: int = 1, probability: float = 1.0, per_second: Optional[float] = None):
+        """
+        print only some of the outputs of `dd()`,`@dd.mincls` and `dd.watch` for every call site.
+        a summary line with the suppressed counts is printed on exit.
+        call without arguments to print everything again.
+
+        Args:
+            every (int): print only every Nth call of each call site. Defaults to 1
+            probability (float): print each call with this probability. Defaults to 1.0
+            per_second (Optional[float]): print at most K calls per second for each call site. Defaults to None
+
+        Returns:
+            ClsDebugger:the ClsDebugger object (dd)
+        """
+        sampler = None
+        if every != 1 or probability < 1 or per_second is not None:
+            sampler = util.Sampler(every=every, probability=probability, per_second=per_second)
+            if not self._sample_summary_registered:
+                atexit.register(self._print_sample_summary)
+                self._sample_summary_registered = True
+        self._set_lazy("_ic", "sampler", sampler)
+        watchlib.sampler = sampler
+        return self
+
+    @property
+    def sampler(self) -> Optional[util.Sampler]:
+        """
+        Get the current sampler (set by `dd.sample`), None if everything is printed.
+        """
+        if "_ic" not in self.__dict__:
+            return self._lazy_options["_ic"].get("sampler")
+        return self._ic.sampler
+
+    def _print_sample_summary(self):
+        sampler = self.sampler
+        if sampler is not None and sampler.summary():
+            self._ic.output(sampler.summary())
+
     def snoop_short_config(self, watch=(), watch_explode=(), depth=1):
         """
         config ddebug Common arguments
@@ -457,7 +942,7 @@ class ClsDebugger:
 
 
         """
-        self._self_snoop = snoop.snoop(watch, watch_explode, depth)
+        self._self_snoop = _import_snoop().snoop(watch, watch_explode, depth)
         return self
 
     def set_excepthook(self, file: str = None, pattern="{}-errors.txt", with_file=True):
@@ -503,6 +988,12 @@ class ClsDebugger:
                     atexit.register(efile.close)
                     self._console.file = efile
                 self._console.print_exception(exc_info=[exc_type, exc_value, tb])
+                self._console.join_exceptions()
+                if sum(error.count for error in self._console.error_stats.values()) > 1:  # handled errors before
+                    self._console.error_summary()
+                if self._flight_recorder is not None:
+                    self._console.print(self._flight_recorder.dump(self._flight_dump_last), markup=False,
+                                        highlight=False)
             except Exception:
                 #
                 print("FATAL excepthook error", file=sys.stderr)
@@ -521,14 +1012,23 @@ class ClsDebugger:
         Getting this value will be True if any of ddebug outputs (watchpoint,snoop,icecream and rich) enabled.
         Setting this value to X will set enabled of all ddebug outputs to X
         """
-        return watchlib.enable or snoop.snoop.config.enabled or self._ic.enabled or (not self._console.quiet)
+        if watchlib.enable or self._snoop_enabled:
+            return True
+        if "_console" in self.__dict__:
+            console_quiet = self._console.quiet
+        else:
+            console_quiet = self._lazy_options["_console"].get("quiet", False)
+        return self._ic_enabled or not console_quiet
 
     @enabled.setter
     def enabled(self, value: bool):
-        snoop.snoop.config.enabled = value
-        self._ic.enabled = value
+        self._snoop_enabled = value
+        _set_snoop_config("enabled", value)
+        if self._trace_recorder is not None:
+            self._trace_recorder.enabled = value
+        self._set_lazy("_ic", "enabled", value)
         watchlib.enable = value
-        self._console.quiet = not value
+        self._set_lazy("_console", "quiet", not value)
 
     @property
     def stream(self):
@@ -541,21 +1041,21 @@ class ClsDebugger:
 
     @stream.setter
     def stream(self, value):
-        self._ic.stream = value
+        self._set_lazy("_ic", "stream", value)
         set_snoop_write(value)
         self.watch_stream = value
-        self._console.file = value
+        self._set_lazy("_console", "file", value)
 
     @property
     def watch_stream(self):
         """
         Get/Set watchpoint stream.
         """
-        return watchlib.watch.file
+        return watchlib.file
 
     @watch_stream.setter
     def watch_stream(self, value):
-        watchlib.watch.file = value
+        watchlib.set_file(value)
 
     def snoopconfig(self, *args, **kwargs):
         """
@@ -570,10 +1070,12 @@ class ClsDebugger:
             ClsDebugger:the ClsDebugger object (dd)
 
         """
+        snoop = _import_snoop()
         snoop.install(
             builtins=False,
             *args, **kwargs
         )
+        self._snoop_enabled = snoop.snoop.config.enabled
         return self
 
     @property
@@ -581,11 +1083,13 @@ class ClsDebugger:
         """
         Get/Set friendly-traceback language
         """
-        return richlib.friendly_traceback.get_lang()
+        import friendly_traceback
+        return friendly_traceback.get_lang()
 
     @friendly_lang.setter
     def friendly_lang(self, lang):
-        richlib.friendly_traceback.set_lang(lang)
+        import friendly_traceback
+        friendly_traceback.set_lang(lang)
 
     @property
     def icecream_includeContext(self):
@@ -596,7 +1100,7 @@ class ClsDebugger:
 
     @icecream_includeContext.setter
     def icecream_includeContext(self, value):
-        self._ic.includeContext = value
+        self._set_lazy("_ic", "includeContext", value)
 
     @property
     def rich_color_system(self):
@@ -608,70 +1112,83 @@ class ClsDebugger:
         return self._console.color_system
 
     @rich_color_system.setter
-    def rich_color_system(self, value: richlib.Optional[
-        richlib.Literal["auto", "standard", "256", "truecolor", "windows"]
+    def rich_color_system(self, value: Optional[
+        Literal["auto", "standard", "256", "truecolor", "windows"]
     ]):
         self._console.color_system = value
 
+    def _operator_call(self, other):
+        """
+        do dd(other) for the operators. skip the frame lookup when ddebug is disabled
+        """
+        if not (self._ic_enabled or self._snoop_enabled):
+            return other
+        return self.__call__(other, _from_frame=sys._getframe(1))  # noqa
+
     def __mul__(self, other):
         """
         do dd(a) on dd*a
         """
-        return self.__call__(other, _from_frame=inspect.currentframe())
+        return self._operator_call(other)
 
     def __matmul__(self, other):
         """
         do dd(a) on dd@a
         """
-        return self.__call__(other, _from_frame=inspect.currentframe())
+        return self._operator_call(other)
 
     def __add__(self, other):
         """
         do dd(a) on dd+a
         """
-        return self.__call__(other, _from_frame=inspect.currentframe())
+        return self._operator_call(other)
 
     def __lshift__(self, other):
         """
         do dd(a) on dd>>a
         """
-        return self.__call__(other, _from_frame=inspect.currentframe())
+        return self._operator_call(other)
 
     def __rshift__(self, other):
         """
         do dd(a) on dd<<a
         """
-        return self.__call__(other, _from_frame=inspect.currentframe())
+        return self._operator_call(other)
 
     def __ror__(self, other):
         """
         do dd(a) on a|dd
         """
-        return self.__call__(other, _from_frame=inspect.currentframe())
+        return self._operator_call(other)
 
     def __or__(self, other):
         """
         do dd(a) on dd|a
         """
-        return self.__call__(other, _from_frame=inspect.currentframe())
+        return self._operator_call(other)
 
     def __and__(self, other):
         """
         do dd(a) on a&d
         """
-        return self.__call__(other, _from_frame=inspect.currentframe())
+        return self._operator_call(other)
 
     def __enter__(self, *args, **kwargs):
         """
         do snoop.__enter__ on dd.__enter__ (enter `with` block)
         """
-        self._self_snoop.__enter__(1)
+        tracer = self._snoop_tracer
+        tracers = getattr(self._with_local, "tracers", None)
+        if tracers is None:
+            tracers = self._with_local.tracers = []
+        tracers.append(tracer)
+        tracer.__enter__(1)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
         do snoop.__exit__ on dd.__exit__ (exit `with` block)
         """
-        self._self_snoop.__exit__(exc_type, exc_val, exc_tb, 1)
+        self._with_local.tracers.pop().__exit__(exc_type, exc_val, exc_tb, 1)
 
 
 # create the dd object
@@ -1,10 +1,21 @@
 """
 utility for ddebug
 """
+import datetime
+import fnmatch
+import gzip
 import io
 import os
+import queue
+import random
 import re
+import shutil
 import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Literal, NamedTuple, Optional, Tuple, Union
 
 
 def getExecPath() -> str:
@@ -37,28 +48,69 @@ class DependencyMissing(BaseException):
             f"Missing optional dependency '{dependency}'. Use `pip install {dependency}` or just install all ddebug optional dependencies by `pip install ddebug[full]`")
 
 
+def record_tag() -> str:
+    """
+    the name of the current thread, plus the name of the current asyncio task if there is one (e.g. `MainThread/Task-1`)
+    """
+    tag = threading.current_thread().name
+    asyncio = sys.modules.get("asyncio")  # asyncio is not imported just for this
+    if asyncio is not None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:  # no running event loop
+            task = None
+        if task is not None:
+            tag += f"/{task.get_name()}"
+    return tag
+
+
+def tag_record(message: str, tag: str) -> str:
+    """
+    prefix every line of message with `[tag] `
+    """
+    prefix = f"[{tag}] "
+    return "".join(prefix + line if line.strip() else line for line in message.splitlines(keepends=True))
+
+
+def tagged_write(write):
+    """
+    wrap write function so every record is tagged with `record_tag()`. the original is in `__wrapped__`
+    """
+
+    def wrapper(message):
+        write(tag_record(message, record_tag()))
+
+    wrapper.__wrapped__ = write
+    return wrapper
+
+
 class Logger:
     """
     write to io_file and to stream
     """
 
-    def __init__(self, io_file, stream):
+    def __init__(self, io_file, stream, autoflush: bool = True):
         """
         init the Logger object.
 
         Args:
             io_file: file io to write (will closed and flush)
             stream: std stream to write
+            autoflush: if True flush io_file on every write. Defaults to True
         """
         self.stream: io.FileIO = stream
         self.log: io.FileIO = io_file
+        self.autoflush = autoflush
+        self._lock = threading.Lock()
 
     def write(self, message):
-        """write a messege to stream (in color) and to io_file (without color)"""
-        self.stream.write(message)
-        self.flush()
-        message = ansi_escape.sub('', message)  # never color-print to file
-        self.log.write(message)
+        """write a messege (whole record) to stream (in color) and to io_file (without color)"""
+        plain = strip_ansi(message)  # never color-print to file
+        with self._lock:  # records of different threads are never mixed
+            self.stream.write(message)
+            self.log.write(plain)
+            if self.autoflush:
+                self.flush()
 
     def flush(self):
         """flush io_file"""
@@ -69,6 +121,538 @@ class Logger:
         self.log.close()
 
 
+class _ThreadFile:
+    """
+    the file of one thread, kept in threading.local - deleted (and the file closed) when the thread ends
+    """
+    __slots__ = ("file", "__weakref__")
+
+    def __init__(self, file):
+        self.file = file
+
+
+def _close_thread_file(files: set, lock: threading.Lock, file):
+    with lock:
+        files.discard(file)
+    file.close()
+
+
+class ThreadFiles:
+    """
+    write every record to stream and to a file of the writing thread, so every thread has its own log.
+    the file of a thread is closed when the thread ends.
+    """
+
+    def __init__(self, pattern: str, stream):
+        """
+        init the ThreadFiles object.
+
+        Args:
+            pattern (str): the file name of every thread - `{thread}` is replaced by the thread name
+            stream: stream to write all the records to (e.g. Logger)
+        """
+        self.pattern = pattern
+        self.stream = stream
+        self._files = set()
+        self._local = threading.local()  # not thread.ident - the ident of ended thread is reused
+        self._lock = threading.Lock()
+
+    def write(self, message):
+        """write a message to stream and (without color) to the file of the current thread"""
+        self.stream.write(message)
+        thread_file = getattr(self._local, "file", None)
+        if thread_file is None:
+            name = re.sub(r"[^\w.-]+", "_", threading.current_thread().name)
+            file = open(self.pattern.format(thread=name), "a")
+            with self._lock:
+                self._files.add(file)
+            thread_file = self._local.file = _ThreadFile(file)
+            weakref.finalize(thread_file, _close_thread_file, self._files, self._lock, file)
+        thread_file.file.write(strip_ansi(message))  # only this thread write to this file
+        thread_file.file.flush()
+
+    def flush(self):
+        """flush stream"""
+        getattr(self.stream, "flush", lambda: None)()
+
+    def close(self):
+        """close stream and the files of the threads"""
+        getattr(self.stream, "close", lambda: None)()
+        with self._lock:
+            files = list(self._files)
+            self._files.clear()
+        for file in files:
+            file.close()
+
+
+def rotated_name(file: str) -> str:
+    """
+    Returns:
+        str: the name of a rotated segment of file - `<name>.<date-time><ext>`
+    """
+    stem, ext = os.path.splitext(file)
+    return f"{stem}.{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{ext}"
+
+
+def rotated_segments(file: str) -> List[str]:
+    """
+    Returns:
+        List[str]: the rotated segments of file (see `rotated_name`), oldest first
+    """
+    folder, base = os.path.split(file)
+    stem, ext = os.path.splitext(base)
+    pattern = re.compile(re.escape(stem) + r"\.\d{8}-\d{6}-\d{6}" + re.escape(ext) + r"(\.gz)?$")
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder or ".") if pattern.match(name))
+
+
+def remove_old_segments(file: str, backup_count: int):
+    """
+    remove the rotated segments of file except the newest backup_count
+    """
+    segments = rotated_segments(file)
+    for segment in segments[:max(len(segments) - backup_count, 0)]:
+        try:
+            os.remove(segment)
+        except OSError:
+            pass
+
+
+class RotatingFile:
+    """
+    text file that is rotated by size or by time. the rotated segments are named `<name>.<date-time><ext>`,
+    can be gzip-compressed in a background thread, and only the newest `backup_count` segments are kept.
+    """
+
+    def __init__(self, file: str, max_bytes: Optional[int] = None, interval: Optional[float] = None,
+                 backup_count: int = 5, compress: bool = False):
+        """
+        init the RotatingFile object. an existing file is rotated (instead of overwritten).
+
+        Args:
+            file (str): the file name
+            max_bytes (Optional[int]): rotate before the file grows over max_bytes characters. Defaults to None
+            interval (Optional[float]): rotate every interval seconds. Defaults to None
+            backup_count (int): number of rotated segments to keep. Defaults to 5
+            compress (bool): if True gzip the rotated segments (in background thread). Defaults to False
+        """
+        self.name = file
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backup_count = backup_count
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._background_lock = threading.Lock()  # compress and remove old segments one at a time
+        self._threads = []
+        if os.path.exists(file) and os.path.getsize(file):
+            self._rotate_file()
+        self._open()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def _open(self):
+        self._file = open(self.name, "w")
+        self._size = 0
+        self._opened = time.monotonic()
+
+    def write(self, message: str):
+        """write message to the file, rotate it first if needed"""
+        with self._lock:
+            if ((self.max_bytes is not None and self._size and self._size + len(message) > self.max_bytes) or
+                    (self.interval is not None and time.monotonic() - self._opened >= self.interval)):
+                self._file.close()
+                self._rotate_file()
+                self._open()
+            self._size += len(message)
+            self._file.write(message)
+
+    def flush(self):
+        """flush the file"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        """close the file and wait for the background compression"""
+        with self._lock:
+            self._file.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def segments(self) -> List[str]:
+        """
+        Returns:
+            List[str]: the rotated segments (oldest first)
+        """
+        return rotated_segments(self.name)
+
+    def _rotate_file(self):
+        segment = rotated_name(self.name)
+        os.replace(self.name, segment)
+        if self.compress:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            thread = threading.Thread(target=self._compress, args=(segment,), name="ddebug-rotate", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        else:
+            self._remove_old()
+
+    def _compress(self, segment: str):
+        with self._background_lock:
+            try:
+                with open(segment, "rb") as source, gzip.open(segment + ".gz", "wb") as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(segment)
+            except OSError:  # never kill the program for the log
+                pass
+            self._remove_old()
+
+    def _remove_old(self):
+        remove_old_segments(self.name, self.backup_count)
+
+
+def open_log(file: str, rotate: Optional[dict] = None):
+    """
+    open log file for write
+
+    Args:
+        file (str): the file name
+        rotate (Optional[dict]): if not None (or False) - `RotatingFile` arguments (max_bytes,interval,backup_count,
+         compress). Defaults to None
+
+    Returns:
+        the opened file or RotatingFile
+    """
+    if not rotate:
+        return open(file, "w")
+    return RotatingFile(file, **rotate)
+
+
+class AsyncWriter:
+    """
+    write to stream in a background thread, so the caller never wait for the file system.
+    """
+    _close_sentinel = object()
+
+    def __init__(self, stream, max_queue: int = 10000, overflow: Literal["block", "drop"] = "block",
+                 batch_size: int = 100):
+        """
+        init the AsyncWriter object and start the writer thread.
+
+        Args:
+            stream: the stream to write to (e.g. file or Logger)
+            max_queue: maximum number of messages waiting to be written. Defaults to 10000
+            overflow: what to do when the queue is full - "block" wait for free space, "drop" discard the message.
+             Defaults to "block"
+            batch_size: maximum number of messages written between flushes. Defaults to 100
+        """
+        if overflow not in ("block", "drop"):
+            raise ValueError(f"overflow must be 'block' or 'drop', not {overflow!r}")
+        if isinstance(stream, Logger):
+            stream.autoflush = False  # the writer thread flush once per batch
+        self.stream = stream
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.dropped = 0
+        """ number of messages discarded because the queue was full (or the stream closed) """
+        self.closed = False
+        self._queue = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._run, name="ddebug-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        """queue a message to write. after `close` write it directly to the stream (or drop it if the stream closed)"""
+        if self.closed:  # e.g. dd output at interpreter shutdown, after the atexit close
+            self._write_now(message)
+            return
+        if self.overflow == "drop":
+            try:
+                self._queue.put_nowait(message)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self._queue.put(message)
+
+    def flush(self):
+        """do nothing - the writer thread flush the stream after every batch. use `join` to wait for it"""
+
+    def join(self):
+        """wait until every queued message written and flushed"""
+        self._queue.join()
+
+    def close(self):
+        """write all the queued messages,stop the writer thread and close the stream"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.put(self._close_sentinel)
+        self._thread.join()
+        while True:  # messages queued by writers that raced with close
+            try:
+                self._write_now(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        getattr(self.stream, "close", lambda: None)()
+
+    def _write_now(self, message):
+        try:
+            self.stream.write(message)
+            getattr(self.stream, "flush", lambda: None)()
+        except (ValueError, OSError):  # the stream itself closed
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for message in batch:
+                if message is self._close_sentinel:
+                    stop = True
+                    continue
+                try:
+                    self.stream.write(message)
+                except Exception:  # never kill the writer thread
+                    pass
+            try:
+                getattr(self.stream, "flush", lambda: None)()
+            except Exception:
+                pass
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+
+class Sampler:
+    """
+    decide which outputs to print for every call site (key) - every Nth call, with probability p and at most K per second.
+    """
+
+    def __init__(self, every: int = 1, probability: float = 1.0, per_second: Optional[float] = None):
+        """
+        init the Sampler object.
+
+        Args:
+            every (int): print only every Nth call of each call site. Defaults to 1
+            probability (float): print each call with this probability. Defaults to 1.0
+            per_second (Optional[float]): print at most K calls per second for each call site. Defaults to None
+        """
+        self.every = every
+        self.probability = probability
+        self.per_second = per_second
+        self.calls = {}
+        """ number of calls of every call site """
+        self.suppressed = {}
+        """ number of suppressed calls of every call site """
+        self._windows = {}
+
+    def __call__(self, key) -> bool:
+        """
+        count a call of the call site key.
+
+        Args:
+            key: the call site (filename,line number)
+
+        Returns:
+            bool: True if this call should be printed
+        """
+        n = self.calls.get(key, 0)
+        self.calls[key] = n + 1
+        keep = n % self.every == 0
+        if keep and self.probability < 1:
+            keep = random.random() < self.probability
+        if keep and self.per_second is not None:
+            now = time.monotonic()
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 1:
+                window = self._windows[key] = [now, 0]
+            if window[1] >= self.per_second:
+                keep = False
+            else:
+                window[1] += 1
+        if not keep:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+        return keep
+
+    def summary(self) -> str:
+        """
+        Returns:
+            str: summary line of the suppressed calls, empty string if nothing suppressed
+        """
+        if not self.suppressed:
+            return ''
+        sites = sorted(self.suppressed.items(), key=lambda item: item[1], reverse=True)
+        sites = ", ".join(f"{os.path.basename(str(filename))}:{line} ({n})" for (filename, line), n in sites)
+        return f"sampling suppressed {sum(self.suppressed.values())} outputs: {sites}"
+
+
+class CallSiteStats:
+    """
+    counters of one dd() call site
+    """
+    __slots__ = ("location", "arg_names", "hits", "first", "last", "numbers")
+
+    def __init__(self, location: str, arg_names: Optional[Tuple[str, ...]]):
+        """
+        init the CallSiteStats object.
+
+        Args:
+            location (str): formatted "file:line in function()"
+            arg_names (Optional[Tuple[str,...]]): the source text of every argument
+        """
+        self.location = location
+        self.arg_names = arg_names or ()
+        self.hits = 0
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self.numbers = {}
+        """ argument index -> [min,max,sum,count] of the numeric values """
+
+    def add(self, args: tuple):
+        """count one call with args"""
+        now = time.time()
+        self.hits += 1
+        if self.first is None:
+            self.first = now
+        self.last = now
+        for index, value in enumerate(args):
+            if type(value) in (int, float):  # not bool
+                numbers = self.numbers.get(index)
+                if numbers is None:
+                    self.numbers[index] = [value, value, value, 1]
+                else:
+                    if value < numbers[0]:
+                        numbers[0] = value
+                    if value > numbers[1]:
+                        numbers[1] = value
+                    numbers[2] += value
+                    numbers[3] += 1
+
+
+class ErrorStats:
+    """
+    counters of one exception fingerprint (see `exception_fingerprint`)
+    """
+    __slots__ = ("name", "location", "count", "first", "last", "samples")
+
+    max_samples = 3
+
+    def __init__(self, name: str, location: str):
+        """
+        init the ErrorStats object.
+
+        Args:
+            name (str): the exception type name
+            location (str): formatted "file:line in function()" of the last traceback frame
+        """
+        self.name = name
+        self.location = location
+        self.count = 0
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self.samples: List[str] = []
+        """ the first different messages (str of the exception) """
+
+    def add(self, exc_value: BaseException):
+        """count one occurrence"""
+        now = time.time()
+        self.count += 1
+        if self.first is None:
+            self.first = now
+        self.last = now
+        if len(self.samples) < self.max_samples:
+            message = str(exc_value)[:200]
+            if message not in self.samples:
+                self.samples.append(message)
+
+
+class CacheInfo(NamedTuple):
+    """
+    statistics of LRUCache
+    """
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache:
+    """
+    bounded mapping that drop the least recently used item when it is full. `get` can run in many threads while
+    one thread (at a time) set items
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        init the LRUCache object.
+
+        Args:
+            maxsize (int): maximum number of items in the cache.
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        """get key value (and mark it as recently used) or default if key is not in the cache"""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        try:
+            self._data.move_to_end(key)
+        except KeyError:  # evicted by other thread meanwhile - the value is still valid
+            pass
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        """remove all items and reset the statistics"""
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Returns:
+            CacheInfo: hits,misses,evictions,maxsize and currsize of the cache
+        """
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._data))
+
+
+class CallSite(NamedTuple):
+    """
+    the source analysis of one dd() call (one code object and bytecode offset)
+    """
+    arg_names: Optional[Tuple[str, ...]]
+    """ the source text of every argument, None if source is not available """
+    context: str
+    """ formatted "file:line in function()" """
+    call_type: str
+    """ "@" if the call line is a decorator (or def/class line) else "()" """
+
+
 def rm_friendly_console(string: str) -> str:
     """
     remove the 'If you are using a REPL' from friendly messege
@@ -81,6 +665,35 @@ def rm_friendly_console(string: str) -> str:
         0].strip()  # you cant use Friendly console in ddebug file
 
 
+def name_filter(include: Union[None, str, Iterable[str], Callable[[str], bool]]) -> Callable[[str], bool]:
+    """
+    create name predicate from `include` - None (all the names), glob pattern (e.g. "user_*"),
+    patterns list or function
+
+    Returns:
+        Callable[[str],bool]: True for names to include
+    """
+    if include is None:
+        return lambda name: True
+    if callable(include):
+        return include
+    patterns = [include] if isinstance(include, str) else list(include)
+    return lambda name: any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def exception_fingerprint(exc_type, tb) -> tuple:
+    """
+    the exception type and the code locations (file,function,line) of its traceback -
+    the same error from the same place has the same fingerprint (whatever the message and the values are)
+    """
+    locations = []
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        locations.append((code.co_filename, code.co_name, tb.tb_lineno))
+        tb = tb.tb_next
+    return (exc_type.__module__, exc_type.__qualname__, tuple(locations))
+
+
 def post_tb(tb, ddebug_input: str = None):
     """
     post traceback to pdb or pdbr if input-time-out or ddebug_input is True
@@ -178,3 +791,27 @@ class Exc:
 
 
 ansi_escape = re.compile(r'(?:\x1B[@-_]|[\x80-\x9F])[0-?]*[ -/]*[@-~]')
+
+
+class Rendered(str):
+    """
+    colored text that also carry its plain (no color) render - so the writers do not need to strip the colors
+    """
+    plain: str
+
+    def __new__(cls, text: str, plain: str):
+        self = super().__new__(cls, text)
+        self.plain = plain
+        return self
+
+
+def strip_ansi(message: str) -> str:
+    """
+    remove the ANSI escape sequences from message. the regex run only if message may have them
+    """
+    plain = getattr(message, "plain", None)
+    if plain is not None:  # Rendered
+        return plain
+    if "\x1b" not in message and message.isascii():  # the 8-bit escapes are not ascii
+        return message
+    return ansi_escape.sub('', message)
@@ -0,0 +1,178 @@
+"""
+flight recorder for ddebug (dd.flight_recorder) - the last dd events in a memory-mapped circular file.
+the data is in the page cache, so it survives hard kills. read it with `python -m ddebug.flightlib file`
+"""
+import argparse
+import datetime
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import List, NamedTuple, Union
+
+from ddebug import dd_util as util
+
+MAGIC = b"DDFLIGHT"
+
+_header_struct = struct.Struct("<8sQQ")  # magic,capacity,position (total bytes written)
+_position_struct = struct.Struct("<Q")
+_length_struct = struct.Struct("<I")  # the record length - before and after every record
+_time_struct = struct.Struct("<d")
+_POSITION_OFFSET = 16
+_MAX_MESSAGE = 4096
+
+
+class FlightEvent(NamedTuple):
+    """
+    one event read from a flight recorder file
+    """
+    time: float
+    kind: str
+    """ "dd","mincls" or "watch" """
+    location: str
+    message: str
+
+    def __str__(self):
+        timestamp = datetime.datetime.fromtimestamp(self.time).strftime('%H:%M:%S.%f')[:-4]
+        return f"{timestamp} {self.kind} {self.location}: {self.message}"
+
+
+class FlightRecorder:
+    """
+    write compact records into memory-mapped circular file. a record is
+    `length,time,kind\\0location\\0message,length` - so the records can be read backward from the last one.
+    """
+
+    def __init__(self, file: str, size: int = 1 << 20, backup_count: int = 5):
+        """
+        init the FlightRecorder object. the file is created with the given size. an existing file (e.g. of the run
+        that just crashed) is kept as `<name>.<date-time><ext>` instead of overwritten.
+
+        Args:
+            file (str): the file name
+            size (int): the size (bytes) of the circular buffer. Defaults to 1 MB
+            backup_count (int): number of previous files to keep. Defaults to 5
+        """
+        if os.path.exists(file) and os.path.getsize(file):
+            if backup_count > 0:
+                os.replace(file, util.rotated_name(file))
+            util.remove_old_segments(file, backup_count)
+        self.name = file
+        self.capacity = size
+        self._position = 0
+        self._max_message = min(_MAX_MESSAGE, size // 16)  # a record (location,message) is much smaller than the buffer
+        self._lock = threading.Lock()
+        with open(file, "w+b") as f:
+            f.truncate(_header_struct.size + size)
+            self._mmap = mmap.mmap(f.fileno(), _header_struct.size + size)
+        self._mmap[:_header_struct.size] = _header_struct.pack(MAGIC, size, 0)
+
+    def record(self, kind: str, location: str, message: str):
+        """
+        write one record (the oldest records are overwritten)
+        """
+        location, message = location[:self._max_message], message[:self._max_message]  # a record never wraps over itself
+        payload = _time_struct.pack(time.time()) + f"{kind}\0{location}\0{message}".encode("utf-8", "replace")
+        length = _length_struct.pack(len(payload))
+        data = length + payload + length
+        with self._lock:
+            if self._mmap.closed:
+                return
+            start = self._position % self.capacity
+            first = min(len(data), self.capacity - start)
+            offset = _header_struct.size + start
+            self._mmap[offset:offset + first] = data[:first]
+            if first < len(data):  # wrap around
+                self._mmap[_header_struct.size:_header_struct.size + len(data) - first] = data[first:]
+            self._position += len(data)
+            # the position is updated after the data - killed in the middle of a record loses only this record
+            self._mmap[_POSITION_OFFSET:_POSITION_OFFSET + 8] = _position_struct.pack(self._position)
+
+    def events(self, last: int = None) -> List[FlightEvent]:
+        """
+        Args:
+            last (int): return only the last N events. Defaults to None (all)
+
+        Returns:
+            List[FlightEvent]: the events in the buffer (oldest first)
+        """
+        with self._lock:
+            return _read_events(bytes(self._mmap), last)
+
+    def dump(self, last: int = 100) -> str:
+        """
+        Returns:
+            str: the last events in readable form
+        """
+        events = self.events(last)
+        lines = [f"flight recorder - last {len(events)} events:"] + [str(event) for event in events]
+        return "\n".join(lines)
+
+    def close(self):
+        """flush and close the file"""
+        with self._lock:
+            if not self._mmap.closed:
+                self._mmap.flush()
+                self._mmap.close()
+
+
+def _read_events(data: bytes, last: int = None) -> List[FlightEvent]:
+    magic, capacity, position = _header_struct.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a ddebug flight recorder file")
+    ring = data[_header_struct.size:_header_struct.size + capacity]
+
+    def read(offset, size):
+        start = offset % capacity
+        chunk = ring[start:start + size]
+        return chunk + ring[:size - len(chunk)]
+
+    oldest = max(0, position - capacity)
+    end = position
+    events = []
+    while end - 2 * _length_struct.size >= oldest and (last is None or len(events) < last):
+        (length,) = _length_struct.unpack(read(end - _length_struct.size, _length_struct.size))
+        start = end - 2 * _length_struct.size - length
+        if start < oldest or _length_struct.unpack(read(start, _length_struct.size))[0] != length:
+            break  # overwritten by newer records
+        payload = read(start + _length_struct.size, length)
+        (timestamp,) = _time_struct.unpack_from(payload)
+        fields = payload[_time_struct.size:].decode("utf-8", "replace").split("\0", 2)
+        if len(fields) != 3:  # half written
+            break
+        events.append(FlightEvent(timestamp, *fields))
+        end = start
+    events.reverse()
+    return events
+
+
+def read_flight(file: Union[str, bytes], last: int = None) -> List[FlightEvent]:
+    """
+    read the events of flight recorder file (also after the process was killed)
+
+    Args:
+        file (Union[str,bytes]): the file name or its content
+        last (int): return only the last N events. Defaults to None (all)
+
+    Returns:
+        List[FlightEvent]: the events (oldest first)
+    """
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            file = f.read()
+    return _read_events(file, last)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ddebug.flightlib",
+                                     description="print the events of a flight recorder file (dd.flight_recorder)")
+    parser.add_argument("file", help="the flight recorder file")
+    parser.add_argument("-n", "--last", type=int, default=None, help="print only the last N events")
+    args = parser.parse_args(argv)
+    for event in read_flight(args.file, args.last):
+        print(event)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+icecream part of ddebug (dd(), dd.mincls)
+"""
+import ast
+import inspect
+import os
+import sys
+import threading
+from types import FrameType
+from typing import Optional
+
+import icecream
+from cheap_repr import cheap_repr
+
+from ddebug import dd_util as util
+from ddebug import jsonlib, limitlib
+
+
+class IceCreamDebugger(icecream.IceCreamDebugger):
+    """
+    class for overwrite some icecream methods to make them match ddebug
+    """
+
+    def __init__(self, *args, call_site_cache_size: int = 1024, **kwargs):
+        kwargs.setdefault("argToStringFunction", self._arg_to_string)
+        super().__init__(*args, **kwargs)
+        self.repr_limits: Optional[limitlib.LimitedRepr] = limitlib.LimitedRepr()
+        """ the limits of the values reprs (dd.limit_reprs), None for full reprs """
+        self.call_sites = util.LRUCache(call_site_cache_size)
+        self._call_sites_lock = threading.Lock()
+        self.sampler: Optional[util.Sampler] = None
+        self.tag_records = False
+        """ if True every record is prefixed by the thread (and asyncio task) name """
+        self.json_sink = None
+        """ jsonlib.JsonSink - if not None the calls are written to it as JSON instead of printed """
+        self.flight_recorder = None
+        """ flightlib.FlightRecorder - if not None the calls are recorded to it instead of printed """
+
+    def _arg_to_string(self, obj) -> str:
+        """
+        icecream.argumentToString (pformat) for small values, bounded repr for huge values
+        """
+        if self.repr_limits is None:
+            return icecream.argumentToString(obj)
+        return self.repr_limits.format(obj, icecream.argumentToString)
+
+    def call_site(self, callFrame) -> util.CallSite:
+        """
+        get the (cached) source analysis of the call in callFrame.
+        the key is the code object and the bytecode offset, so every call after the first one only format values.
+        """
+        key = (callFrame.f_code, callFrame.f_lasti)
+        site = self.call_sites.get(key)
+        if site is None:
+            with self._call_sites_lock:  # executing/asttokens build their source analysis lazily - not thread safe
+                if key in self.call_sites:  # analyzed by other thread
+                    return self.call_sites.get(key)
+                site = self.call_sites[key] = self._analyze_call_site(callFrame)
+        return site
+
+    def _analyze_call_site(self, callFrame) -> util.CallSite:
+        """
+        copy of ic._formatArgs (argument names part) but with operators and decorators
+        """
+        callNode = icecream.Source.executing(callFrame).node
+        if callNode is None:
+            return util.CallSite(None, '', _get_line_call_type(callFrame))
+        context = self._formatContext(callFrame, callNode)
+        if isinstance(callNode, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):  # @dd
+            return util.CallSite((), context, "@")
+
+        source = icecream.Source.for_frame(callFrame)
+        try:
+            sanitizedArgStrs = [
+                source.get_text_with_indentation(arg)
+                for arg in callNode.args]
+        except AttributeError:  # callNode(type:BinOp) has no attribute 'args'
+            sanitizedArgStrs = [
+                source.get_text_with_indentation(callNode.parent)]
+        return util.CallSite(tuple(sanitizedArgStrs), context, "()")
+
+    def _format(self, callFrame, *args):
+        """
+        copy of ic._format but with the cached call site.
+        """
+        prefix = icecream.callOrValue(self.prefix)
+        site = self.call_site(callFrame)
+        if site.arg_names is None:
+            raise icecream.NoSourceAvailableError()
+
+        context = site.context
+        if not args:
+            out = prefix + context + self._formatTime()
+        else:
+            if not self.includeContext:
+                context = ''
+            pairs = list(zip(site.arg_names, args))
+            out = self._constructArgumentOutput(prefix, context, pairs)
+        return out
+
+    def output(self, text: str):
+        """
+        print text with the prefix
+        """
+        self._emit(icecream.callOrValue(self.prefix) + text)
+
+    def _emit(self, out: str):
+        """
+        write a whole record to the output function
+        """
+        if self.tag_records:
+            out = util.tag_record(out, util.record_tag())
+        self.outputFunction(out)
+
+    def format_ic(self, callFrame, *args):
+        """
+        copy of ic.__call__ but getting callFrame.
+        """
+        if self.sampler is not None and not self.sampler((callFrame.f_code.co_filename, callFrame.f_lineno)):
+            return
+        if self.flight_recorder is not None:
+            site = self.call_site(callFrame)
+            names = site.arg_names or [f"arg{i}" for i in range(len(args))]
+            self.flight_recorder.record("dd", site.context or _location(callFrame),
+                                        ", ".join(f"{name}={cheap_repr(value)}" for name, value in zip(names, args)))
+            return
+        if self.json_sink is not None:
+            site = self.call_site(callFrame)
+            names = site.arg_names or [f"arg{i}" for i in range(len(args))]
+            self.json_sink.emit("icecream", "dd", callFrame, context=site.context,
+                                values={name: jsonlib.json_value(value) for name, value in zip(names, args)})
+            return
+        try:
+            out = self._format(callFrame, *args)
+        except icecream.NoSourceAvailableError as err:
+            prefix = icecream.callOrValue(self.prefix)
+            out = prefix + 'Error: ' + err.infoMessage
+        self._emit(out)
+
+    def print_class_call(self, name, cls_name, callFrame):
+        """
+        print class call for dd.mincls
+        """
+        if self.enabled:
+            if self.sampler is not None and not self.sampler((callFrame.f_code.co_filename, callFrame.f_lineno)):
+                return
+            if self.flight_recorder is not None:
+                self.flight_recorder.record("mincls", _location(callFrame), f"call method '{name}' from class '{cls_name}'")
+                return
+            if self.json_sink is not None:
+                self.json_sink.emit("icecream", "mincls", callFrame, method=name, cls=cls_name)
+                return
+            prefix = icecream.callOrValue(self.prefix)
+            site = self.call_site(callFrame)
+            if site.arg_names is None:
+                self._emit(
+                    f"error NoSourceAvailableError(Failed to access the underlying source code for analysis) :call "
+                    f"method '{name}' from class '{cls_name}'")
+                return
+
+            context = site.context
+
+            # context = context.split(" at ")
+            #
+            time = self._formatTime()
+            out = prefix + context + f": call method '{name}' from class '{cls_name}'" + time
+            self._emit(out)
+
+    @property
+    def stream(self):
+        """
+        Get/Set icecream stream
+        """
+        if hasattr(self, "_file"):
+            return self._file
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        self._file = value  # noqa
+        if value != sys.stderr:
+            self.outputFunction = self._output_txt
+        else:
+            self.outputFunction = icecream.DEFAULT_OUTPUT_FUNCTION
+
+    def _output_txt(self, s):
+        self._streamPrint(s)
+
+    def _streamPrint(self, *args):
+        file = sys.stderr
+        if hasattr(self, "_file"):
+            file = self._file
+        file.write(" ".join(map(str, args)) + "\n")  # one write - the record is not split between threads
+
+
+def _location(frame: FrameType) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}()"
+
+
+def _get_line_call_type(frame: FrameType) -> str:
+    """
+    find @dd or dd() from the source line of the frame. used when the call node is not available.
+
+    Args:
+        frame: call frame
+
+    Returns: () or @
+    """
+    code_context = inspect.getframeinfo(frame).code_context
+    call_type = "()"
+    if code_context:
+        code_context = code_context[0].strip()
+        # the decorator call line is the "def" line before python 3.8, and the "@" line after it
+        if code_context.startswith(("def", "class", "@")):  # @dd
+            call_type = "@"
+    return call_type
@@ -0,0 +1,120 @@
+"""
+structured JSON Lines output for ddebug (dd.json_output)
+"""
+import json
+import threading
+import time
+import traceback
+from types import FrameType
+from typing import Optional, TextIO, Tuple, Union
+
+from cheap_repr import cheap_repr
+
+from ddebug import dd_util as util
+from ddebug import tracelib
+
+_KIND_NAMES = {tracelib.CALL: "call", tracelib.LINE: "line", tracelib.RETURN: "return",
+               tracelib.EXCEPTION: "exception", tracelib.ENTER: "enter", tracelib.EXIT: "exit"}
+
+
+def json_value(value):
+    """
+    the value itself if JSON can hold it (str,int,float,bool,None), else cheap (truncated) repr of it
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return cheap_repr(value)
+
+
+class JsonSink:
+    """
+    write ddebug events as JSON Lines - one JSON object (with time,channel,event,thread and location) per event
+    """
+
+    def __init__(self, file: Union[str, TextIO]):
+        """
+        init the JsonSink object.
+
+        Args:
+            file (Union[str,TextIO]): path or text file to write the events to
+        """
+        if isinstance(file, str):
+            file = open(file, "w", encoding="utf-8", buffering=1 << 16)
+        self.file = file
+        self._lock = threading.Lock()
+
+    def emit(self, channel: str, event: str, frame: Optional[FrameType] = None, **fields):
+        """
+        write one event
+
+        Args:
+            channel (str): the ddebug channel - "icecream","watch","snoop" or "rich"
+            event (str): the event name (e.g. "dd","mincls","watch","line","exception")
+            frame (Optional[FrameType]): the frame of the event location. Defaults to None
+            **fields: more values of the event
+        """
+        record = {"time": time.time(), "channel": channel, "event": event, "thread": util.record_tag()}
+        if frame is not None:
+            record["file"] = frame.f_code.co_filename
+            record["line"] = frame.f_lineno
+            record["function"] = frame.f_code.co_name
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=cheap_repr) + "\n"
+        with self._lock:
+            if not self.file.closed:
+                self.file.write(line)
+
+    def exception(self, exc_type, exc_value, tb):
+        """
+        write exception event with the traceback frames
+        """
+        frames = [{"file": summary.filename, "line": summary.lineno, "function": summary.name}
+                  for summary in traceback.extract_tb(tb)]
+        self.emit("rich", "exception", type=exc_type.__name__, message=str(exc_value), traceback=frames,
+                  **(frames[-1] if frames else {}))
+        self.flush()  # the process may die soon
+
+    def flush(self):
+        """flush the file"""
+        with self._lock:
+            if not self.file.closed:
+                self.file.flush()
+
+    def close(self):
+        """flush and close the file"""
+        with self._lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+class JsonTraceRecorder(tracelib.TraceRecorder):
+    """
+    TraceRecorder that write every trace event (call,line,return,exception and with block enter/exit)
+    to JsonSink (channel "snoop") instead of the binary trace file
+    """
+
+    def __init__(self, sink: JsonSink):
+        """
+        init the JsonTraceRecorder object.
+
+        Args:
+            sink (JsonSink): the sink to write to
+        """
+        self.sink = sink
+        super().__init__(sink.file)
+
+    def _write_header(self):
+        pass
+
+    def close(self):
+        """flush the sink (the sink is closed by its owner)"""
+        self.sink.flush()
+
+    def _write_event(self, kind: int, frame, variables: Tuple[Tuple[str, str], ...]):
+        values = dict(variables)
+        fields = {}
+        for special in ("<return>", "<exception>"):
+            if special in values:
+                fields[special.strip("<>")] = values.pop(special)
+        self.sink.emit("snoop", _KIND_NAMES[kind], frame, variables=values, **fields)
+
@@ -0,0 +1,207 @@
+"""
+bounded reprs for ddebug (dd.limit_reprs) - the repr of huge values is cut while it is generated
+"""
+import collections.abc
+import itertools
+import reprlib
+import time
+from typing import Callable, Optional
+
+
+def _type_module(obj) -> str:
+    return type(obj).__module__.split(".")[0]
+
+
+_STRINGS = (str, bytes, bytearray)
+_CONTAINERS = (list, tuple, set, frozenset, collections.deque)
+_SCALARS = (int, float, complex, bool, type(None))
+_STDLIB_REPRS = (list.__repr__, tuple.__repr__, set.__repr__, frozenset.__repr__, collections.deque.__repr__,
+                 dict.__repr__, collections.OrderedDict.__repr__, collections.defaultdict.__repr__,
+                 collections.Counter.__repr__)
+""" the __repr__ of the builtin and collections containers - subclasses that keep one of them can be small """
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class ReprText:
+    """
+    value that its repr is the given text - for rich renderers (e.g. render_scope) of already bounded reprs
+    """
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __repr__(self):
+        return self.text
+
+
+class LimitedRepr(reprlib.Repr):
+    """
+    reprlib.Repr with ddebug limits: max items of every container, max string length and max depth.
+    NumPy arrays, pandas objects, bytes and big mappings are summarized (shape, dtype, head/tail).
+    the cost of a repr is O(limits) - not O(size of the object).
+    """
+
+    def __init__(self, max_items: int = 100, max_string: int = 1000, max_depth: int = 6, head: int = 3,
+                 time_budget: Optional[float] = None):
+        """
+        init the LimitedRepr object.
+
+        Args:
+            max_items (int): max items of every container. Defaults to 100
+            max_string (int): max length of string,bytes and repr of other objects. Defaults to 1000
+            max_depth (int): max depth of nested containers. Defaults to 6
+            head (int): number of items in the head and in the tail of summaries. Defaults to 3
+            time_budget (Optional[float]): stop the bounded repr of one value after this time (seconds).
+             Defaults to None (no time limit)
+        """
+        super().__init__()
+        self.time_budget = time_budget
+        self._deadline: Optional[float] = None
+        self.max_items = self.maxtuple = self.maxlist = self.maxarray = self.maxdict = max_items
+        self.maxset = self.maxfrozenset = self.maxdeque = max_items
+        self.max_string = self.maxstring = self.maxlong = self.maxother = max_string
+        self.max_depth = self.maxlevel = max_depth
+        self.head = head
+
+    def format(self, obj, default: Callable[[object], str] = repr) -> str:
+        """
+        default(obj) if obj is small (within the limits), else the bounded repr
+
+        Args:
+            obj: the object
+            default (Callable[[object],str]): the function for small objects (e.g. pprint.pformat). Defaults to repr
+        """
+        self._deadline = time.perf_counter() + self.time_budget if self.time_budget else None
+        try:
+            if self.is_small(obj):
+                return default(obj)
+            return self.repr(obj)
+        except _BudgetExceeded:
+            return f"<{type(obj).__name__} - repr stopped after {self.time_budget * 1000:.3g} ms>"
+        finally:
+            self._deadline = None
+
+    def is_small(self, obj) -> bool:
+        """
+        check if obj is within the limits: no container has more than max_items items, no string is longer than
+        max_string and the nesting is not deeper than max_depth. only builtin values and containers with a stdlib
+        __repr__ (e.g. OrderedDict, defaultdict and Counter) can be small - the repr of other objects (their
+        __repr__ can be huge or slow) is always bounded. visit at most max_items ** 2 objects
+        """
+        stack = [(obj, 0)]
+        budget = self.max_items ** 2
+        while stack:
+            value, depth = stack.pop()
+            budget -= 1
+            if budget < 0 or depth > self.max_depth:
+                return False
+            kind = type(value)
+            if kind in _STRINGS:
+                if len(value) > self.max_string:
+                    return False
+            elif kind in _SCALARS:
+                pass
+            elif kind.__repr__ not in _STDLIB_REPRS:
+                return False  # bounded by repr1
+            elif isinstance(value, dict):
+                if len(value) > self.max_items:
+                    return False
+                stack.extend((item, depth + 1) for pair in dict.items(value) for item in pair)
+            elif isinstance(value, _CONTAINERS):
+                if len(value) > self.max_items:
+                    return False
+                stack.extend((item, depth + 1) for item in value)
+            else:
+                return False
+        return True
+
+    def _check_deadline(self):
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise _BudgetExceeded
+
+    def repr1(self, x, level):
+        self._check_deadline()
+        if _type_module(x) == "numpy" and hasattr(x, "shape") and hasattr(x, "flat"):
+            return self.repr_numpy(x, level)
+        if _type_module(x) == "pandas" and hasattr(x, "shape") and hasattr(x, "head"):
+            return self.repr_pandas(x, level)
+        if isinstance(x, collections.abc.Mapping):
+            return self.repr_mapping(x, level)
+        if isinstance(x, (bytes, bytearray, memoryview)):
+            return self.repr_bytes(x, level)
+        if type(x) in (set, frozenset):
+            return self.repr_unsorted_set(x, level)
+        return super().repr1(x, level)
+
+    def repr_instance(self, x, level) -> str:
+        result = super().repr_instance(x, level)  # one __repr__ call can not be stopped - but its result is dropped
+        self._check_deadline()
+        return result
+
+    def _repr_iterable(self, x, level, left, right, maxiter, trail=''):
+        result = super()._repr_iterable(x, level, left, right, maxiter, trail)
+        if len(x) > maxiter:
+            result += f" (len={len(x)})"
+        return result
+
+    def repr_numpy(self, x, level) -> str:
+        if x.size <= self.max_items:
+            return self.repr_instance(x, level)
+        head = self.repr1(x.flat[:self.head].tolist(), level - 1)
+        tail = self.repr1(x.flat[x.size - self.head:].tolist(), level - 1)
+        return f"{type(x).__name__}(shape={x.shape}, dtype={x.dtype}, head={head}, tail={tail})"
+
+    def repr_pandas(self, x, level) -> str:
+        if len(x) <= self.max_items:
+            return self.repr_instance(x, level)
+        description = f"{type(x).__name__}(shape={x.shape}"
+        if hasattr(x, "columns"):
+            columns = [self.repr1(column, level - 1) for column in itertools.islice(x.columns, self.max_items)]
+            more = ", ..." if len(x.columns) > self.max_items else ""
+            description += f", columns=[{', '.join(columns)}{more}]"
+        elif hasattr(x, "dtype"):
+            description += f", dtype={x.dtype}"
+        return f"{description})\nhead:\n{x.head(self.head)}\ntail:\n{x.tail(self.head)}"
+
+    def repr_mapping(self, x, level) -> str:
+        name = "" if type(x) is dict else type(x).__name__
+        if not x:
+            return f"{name}({{}})" if name else "{}"
+        if level <= 0:
+            return f"{name}({{...}})" if name else "{...}"
+        pieces = [f"{self.repr1(key, level - 1)}: {self.repr1(x[key], level - 1)}"
+                  for key in itertools.islice(x, self.max_items)]  # insertion order - sorting is O(n log n)
+        if len(x) > self.max_items:
+            pieces.append(f"... ({len(x)} items)")
+        body = "{" + ", ".join(pieces) + "}"
+        return f"{name}({body})" if name else body
+
+    repr_dict = repr_mapping
+
+    def repr_unsorted_set(self, x, level) -> str:
+        if not x:
+            return f"{type(x).__name__}()"
+        if level <= 0:
+            return "{...}" if type(x) is set else "frozenset({...})"
+        pieces = [self.repr1(item, level - 1) for item in itertools.islice(x, self.max_items)]
+        if len(x) > self.max_items:
+            pieces.append(f"... ({len(x)} items)")
+        body = "{" + ", ".join(pieces) + "}"
+        return body if type(x) is set else f"frozenset({body})"
+
+    def repr_bytes(self, x, level) -> str:
+        if len(x) <= self.max_string:
+            return repr(x)
+        head = repr(bytes(x[:self.head * 8]))
+        tail = repr(bytes(x[len(x) - self.head * 8:]))
+        return f"{type(x).__name__}(len={len(x)}, head={head}, tail={tail})"
+
+    def repr_str(self, x, level) -> str:
+        if len(x) <= self.max_string:
+            return repr(x)
+        half = self.max_string // 2
+        return f"{x[:half]!r}...{x[len(x) - half:]!r} (len={len(x)})"
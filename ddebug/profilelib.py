@@ -0,0 +1,188 @@
+"""
+statistical profiler for ddebug (dd.profile)
+"""
+import collections
+import functools
+import os
+import sys
+import threading
+import time
+from typing import Counter, Optional, Tuple
+
+StackFrame = Tuple[str, str, int]
+""" (filename,function name,first line number) """
+
+
+def _depth(frame) -> int:
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+class ProfileResult:
+    """
+    the stacks collected by the profiler
+    """
+
+    def __init__(self, interval: float):
+        """
+        init the ProfileResult object.
+
+        Args:
+            interval (float): the sampling interval in seconds
+        """
+        self.interval = interval
+        self.stacks: Counter[Tuple[StackFrame, ...]] = collections.Counter()
+        """ number of samples of every stack (the outermost frame first) """
+        self.duration = 0.0
+
+    @property
+    def samples(self) -> int:
+        """number of samples"""
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """
+        Returns:
+            str: the stacks in the collapsed-stack format of flamegraph tools (`frame;frame;frame count` lines)
+        """
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = ";".join(f"{name} ({os.path.basename(filename)}:{line})" for filename, name, line in stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_collapsed(self, file: str):
+        """
+        write the collapsed stacks to file (for flamegraph.pl, speedscope, etc.)
+
+        Args:
+            file (str): the file name
+        """
+        with open(file, "w") as f:
+            f.write(self.collapsed())
+
+
+class _Sampler(threading.Thread):
+    """
+    thread that sample the stack of another thread every interval
+    """
+
+    def __init__(self, thread_id: int, root_depth: int, interval: float):
+        super().__init__(name="ddebug-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.root_depth = root_depth
+        self.result = ProfileResult(interval)
+        self.start_time = time.perf_counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        interval = self.result.interval
+        stacks = self.result.stacks
+        while not self._stop_event.wait(interval):
+            frame = sys._current_frames().get(self.thread_id)  # noqa
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+                frame = frame.f_back
+            if len(stack) < self.root_depth:  # not inside the profiled block
+                continue
+            stack.reverse()
+            stack = tuple(stack[self.root_depth - 1:])
+            if any(filename == __file__ for filename, _name, _line in stack):  # starting or stopping the profiler
+                continue
+            stacks[stack] += 1
+
+    def stop(self) -> ProfileResult:
+        self._stop_event.set()
+        self.join()
+        self.result.duration = time.perf_counter() - self.start_time
+        return self.result
+
+
+class Profile:
+    """
+    statistical profiler for ddebug - use as `@dd.profile`,`with dd.profile` or `@dd.profile(interval=0.01)`
+    """
+
+    def __init__(self, dd_obj, interval: float = 0.005, collapsed_file: Optional[str] = None,
+                 min_percent: float = 1.0):
+        """
+        init the Profile object.
+
+        Args:
+            dd_obj (ClsDebugger): ClsDebugger object.
+            interval (float): seconds between samples. Defaults to 0.005 (the default thread switch interval)
+            collapsed_file (Optional[str]): file to write the collapsed stacks (for flamegraph tools). Defaults to None
+            min_percent (float): hide call paths with less than this percent of the samples. Defaults to 1.0
+        """
+        self.dd = dd_obj
+        self.interval = interval
+        self.collapsed_file = collapsed_file
+        self.min_percent = min_percent
+        self.last: Optional[ProfileResult] = None
+        """ the result of the last profiled block """
+        self._with = threading.local()
+        """ the samplers of the `with` blocks of every thread """
+
+    def __call__(self, func=None, *, interval: float = None, collapsed_file: Optional[str] = None,
+                 min_percent: float = None):
+        """
+        in `@dd.profile` profile every call of the function.
+        in `dd.profile(...)` return a Profile with this options (for `@dd.profile(...)` and `with dd.profile(...)`)
+
+        Args:
+            func (function or None): function if called by @
+            interval (float): seconds between samples
+            collapsed_file (Optional[str]): file to write the collapsed stacks (for flamegraph tools)
+            min_percent (float): hide call paths with less than this percent of the samples
+        """
+        if func is None:
+            return Profile(self.dd,
+                           interval=self.interval if interval is None else interval,
+                           collapsed_file=collapsed_file or self.collapsed_file,
+                           min_percent=self.min_percent if min_percent is None else min_percent)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            sampler = self._start(_depth(sys._getframe()) + 1)  # noqa - the root is the function frame
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._stop(sampler, f"@dd.profile on {func.__qualname__}")
+
+        return wrapper
+
+    def __enter__(self):
+        samplers = getattr(self._with, "samplers", None)
+        if samplers is None:
+            samplers = self._with.samplers = []
+        samplers.append(self._start(_depth(sys._getframe(1))))  # noqa - the root is the `with` block frame
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop(self._with.samplers.pop(), "with dd.profile")
+
+    def _start(self, root_depth: int) -> Optional[_Sampler]:
+        """
+        Returns:
+            Optional[_Sampler]: the started sampler of the current thread, None if ddebug is disabled
+        """
+        if not self.dd.enabled:
+            return None
+        sampler = _Sampler(threading.get_ident(), root_depth, self.interval)
+        sampler.start()
+        return sampler
+
+    def _stop(self, sampler: Optional[_Sampler], title: str) -> Optional[ProfileResult]:
+        if sampler is None:
+            return None
+        result = sampler.stop()
+        self.last = result
+        if self.collapsed_file:
+            result.write_collapsed(self.collapsed_file)
+        self.dd._console.print_profile(result, title=title, min_percent=self.min_percent)  # noqa
+        return result
@@ -0,0 +1,87 @@
+"""
+render trace files recorded by `dd.record_trace` in the snoop format.
+
+usage: python -m ddebug.replay trace-file [-o output-file] [-t thread-name]
+"""
+import argparse
+import datetime
+import linecache
+import sys
+from typing import Callable, Iterable
+
+from ddebug import tracelib
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-4]
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def render(events: Iterable[tracelib.TraceEvent], write: Callable[[str], None]) -> None:
+    """
+    render trace events like snoop output. when the events of other thread start, a `--- thread <name>` line is
+    written
+
+    Args:
+        events (Iterable[tracelib.TraceEvent]): the events (from tracelib.read_trace)
+        write (Callable[[str],None]): function to write every rendered line
+    """
+    indents = {}
+    last_thread = None
+    for event in events:
+        prefix = _format_time(event.time)
+        if last_thread is not None and event.thread != last_thread:
+            write(f"{prefix} --- thread {event.thread}")
+        last_thread = event.thread
+        last_indent = indents.get(event.thread, 0)
+        variables = [(name, value) for name, value in event.variables if not name.startswith("<")]
+        special = dict((name, value) for name, value in event.variables if name.startswith("<"))
+
+        if event.kind == tracelib.CALL:
+            write(f"{prefix} >>> Call to {event.name} in File \"{event.filename}\", line {event.lineno}")
+            last_indent = indents[event.thread] = 0
+        elif event.kind == tracelib.ENTER:
+            write(f"{prefix} >>> Enter with block in {event.name} in File \"{event.filename}\", line {event.lineno}")
+            indents[event.thread] = _indent(linecache.getline(event.filename, event.lineno))
+            continue
+
+        dots = "." * (6 + last_indent)
+        for name, value in variables:
+            write(f"{prefix} {dots} {name} = {value}")
+
+        if event.kind == tracelib.LINE:
+            source = linecache.getline(event.filename, event.lineno).rstrip()
+            write(f"{prefix} {event.lineno:>4} | {source}")
+            indents[event.thread] = _indent(source)
+        elif event.kind == tracelib.EXCEPTION:
+            write(f"{prefix} !!! {special.get('<exception>', '')}")
+        elif event.kind == tracelib.RETURN:
+            write(f"{prefix} <<< Return value from {event.name}: {special.get('<return>', '')}")
+        elif event.kind == tracelib.EXIT:
+            write(f"{prefix} <<< Exit with block in {event.name}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ddebug.replay",
+                                     description="render a trace file recorded by dd.record_trace")
+    parser.add_argument("trace", help="the trace file")
+    parser.add_argument("-o", "--output", help="write the output to this file instead of stdout")
+    parser.add_argument("-t", "--thread", help="render only the events of this thread")
+    args = parser.parse_args(argv)
+    events = tracelib.read_trace(args.trace)
+    if args.thread is not None:
+        events = (event for event in events if event.thread == args.thread)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        render(events, lambda line: print(line, file=output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
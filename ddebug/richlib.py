@@ -1,31 +1,27 @@
 """
 rich part of ddebug (colors)
 """
+import datetime
 import functools
 import inspect
 import os
+import queue
 import sys
+import textwrap
+import threading
 import timeit
 from contextlib import contextmanager
-from typing import Any, List, Literal, Optional, Callable, Iterable, Union
+from traceback import format_exception
+from typing import Any, List, Literal, Optional, Callable, Iterable, Union, Dict
 
-import friendly_traceback.core
-import icecream
 import rich
 import rich.console
-import rich.markdown
-import rich.panel
-import rich.pretty
-import rich.traceback
 from rich.console import _COLOR_SYSTEMS_NAMES  # noqa
-from rich.scope import render_scope
 
 import ddebug.dd_util as util
+from ddebug import timelib
 
-try:
-    from deepdiff import DeepDiff
-except ImportError:
-    DeepDiff = None
+# friendly_traceback, deepdiff, icecream and the rich renderables are imported on first use (for fast `import ddebug`)
 
 
 class Console(rich.console.Console):
@@ -38,6 +34,31 @@ class Console(rich.console.Console):
     ] = "auto", ):
         super().__init__(color_system=color_system)
         # self.quiet
+        self.json_sink = None  # jsonlib.JsonSink (dd.json_output)
+        self.timeit_history: Optional[str] = None
+        self.timeit_threshold = 0.1
+        self.fast_exceptions = False
+        """ print plain traceback, and the rich traceback with friendly explanation only for the first occurrence
+        of every exception fingerprint (see `util.exception_fingerprint`) """
+        self.background_exceptions = False
+        """ with fast_exceptions - render the first occurrence in a background thread (after the plain traceback) """
+        self.dedup_exceptions = False
+        """ print only the first occurrence of every exception fingerprint - the rest are only counted """
+        self.error_stats: Dict[tuple, util.ErrorStats] = {}
+        """ exception fingerprint -> counters of print_exception calls with dedup_exceptions or fast_exceptions
+        (see `error_summary`) """
+        self._error_stats_lock = threading.Lock()
+        self._exception_jobs: Optional[queue.Queue] = None
+
+    def _render_buffer(self, buffer: Iterable["rich.segment.Segment"]) -> str:
+        """
+        render the buffer once colored and once plain (for the log files - see `util.Logger`)
+        """
+        buffer = list(buffer)
+        text = super()._render_buffer(buffer)
+        if "\x1b" not in text:
+            return text
+        return util.Rendered(text, "".join(segment_text for segment_text, _style, control in buffer if not control))
 
     @contextmanager
     def logerror(self, show_locals: bool = False):
@@ -60,6 +81,10 @@ class Console(rich.console.Console):
         return s_wrapper(show_locals) if callable(show_locals) else s_wrapper
 
     def _rich_friendly(self, exc_type, exc_value, tb):
+        import friendly_traceback.core
+        import rich.markdown
+        import rich.panel
+
         fr = friendly_traceback.core.FriendlyTraceback(exc_type, exc_value, tb)
         fr.compile_info()
 
@@ -112,8 +137,23 @@ class Console(rich.console.Console):
                 exc_type, exc_value, traceback = sys.last_type, sys.last_value, sys.last_traceback
             except AttributeError:  # no exception
                 return
+        first = True
+        if self.dedup_exceptions or self.fast_exceptions:  # counted only when needed - error_stats grows
+            first = self._count_error(exc_type, exc_value, traceback)
+        if self.dedup_exceptions and not first:
+            return
+        if self.json_sink is not None:
+            self.json_sink.exception(exc_type, exc_value, traceback)
+            return
+        if self.fast_exceptions:
+            if not first or self.background_exceptions:
+                self.out("".join(format_exception(exc_type, exc_value, traceback)).rstrip("\n"), highlight=False)
+            if not first:
+                return
 
-        rich_trace = rich.traceback.Traceback.from_exception(
+        from ddebug import sourcelib
+        sourcelib.cache_exception(exc_value, traceback)
+        rich_trace = sourcelib.traceback_class().from_exception(
             exc_type, exc_value, traceback,
             width=width,
             extra_lines=extra_lines,
@@ -121,16 +161,92 @@ class Console(rich.console.Console):
             word_wrap=word_wrap,
             show_locals=show_locals,
             suppress=suppress,
-        )
+            max_frames=max_frames,
+        )  # the locals are taken now - only the rendering is deferred
+        if self.fast_exceptions and self.background_exceptions:
+            self._render_in_background(rich_trace, (exc_type, exc_value, traceback))
+            return
         self.print(rich_trace)
 
         # Friendly Explanation
         friendly_trace = self._rich_friendly(exc_type, exc_value, traceback)
         self.print(friendly_trace)
 
+    def _count_error(self, exc_type, exc_value, tb) -> bool:
+        """
+        add the exception to error_stats
+
+        Returns:
+            bool: True if it is the first occurrence of the fingerprint
+        """
+        fingerprint = util.exception_fingerprint(exc_type, tb)
+        with self._error_stats_lock:
+            stats = self.error_stats.get(fingerprint)
+            first = stats is None
+            if first:
+                location = "?"
+                if fingerprint[2]:
+                    filename, function, lineno = fingerprint[2][-1]
+                    location = f"{filename}:{lineno} in {function}()"
+                stats = self.error_stats[fingerprint] = util.ErrorStats(exc_type.__name__, location)
+            stats.add(exc_value)
+        return first
+
+    def error_summary(self):
+        """
+        print rich table of the exceptions counted by print_exception (most frequent first)
+        """
+        import rich.table
+        import rich.text
+
+        table = rich.table.Table(title="dd.error_summary")
+        table.add_column("error", style="red")
+        table.add_column("location", style="yellow")
+        table.add_column("count", justify="right", style="blue")
+        table.add_column("first", style="dim")
+        table.add_column("last", style="dim")
+        table.add_column("samples", style="cyan")
+
+        def time_string(timestamp):
+            return datetime.datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3]
+
+        with self._error_stats_lock:
+            errors = sorted(self.error_stats.values(), key=lambda error: error.count, reverse=True)
+        for error in errors:  # Text - the messages are not markup
+            table.add_row(error.name, rich.text.Text(error.location), str(error.count), time_string(error.first),
+                          time_string(error.last), rich.text.Text("\n".join(error.samples)))
+        self.print(table)
+
+    def _render_in_background(self, rich_trace, exc_info: tuple):
+        if self._exception_jobs is None:
+            self._exception_jobs = queue.Queue()
+            threading.Thread(target=self._exception_worker, name="ddebug-exceptions", daemon=True).start()
+        self._exception_jobs.put((rich_trace, exc_info))
+
+    def _exception_worker(self):
+        while True:
+            rich_trace, exc_info = self._exception_jobs.get()
+            try:
+                self.print(rich_trace)
+                self.print(self._rich_friendly(*exc_info))
+            except Exception as e:  # keep the worker alive
+                self.out(f"ddebug: failed to render {exc_info[0].__name__} in the background: {e!r}", highlight=False)
+            finally:
+                self._exception_jobs.task_done()
+
+    def join_exceptions(self):
+        """wait until the exceptions rendered in the background are printed"""
+        if self._exception_jobs is not None:
+            self._exception_jobs.join()
+
     def diff(self, obj1, obj2, **deep_diff_kws):
-        if not DeepDiff:
+        try:
+            from deepdiff import DeepDiff
+        except ImportError:
             raise util.DependencyMissing("deepdiff")
+        import rich.panel
+        import rich.pretty
+
         frame = inspect.currentframe().f_back
         line = frame.f_lineno
         file = frame.f_code.co_filename
@@ -155,9 +271,33 @@ class Console(rich.console.Console):
                 dunder: bool = False,
                 sort: bool = True,
                 all: bool = False,
-                value: bool = True):
-        rich.inspect(obj, console=self, title=title, help=help, methods=methods, docs=docs, private=private,
-                     dunder=dunder, sort=sort, all=all, value=value)
+                value: bool = True,
+                include: Union[None, str, Iterable[str], Callable[[str], bool]] = None,
+                max_items: int = 10,
+                max_string: int = 80,
+                max_depth: int = 3,
+                time_budget: Optional[float] = 0.05):
+        """
+        rich.inspect with bounded reprs of the object and its attributes
+
+        Args:
+            include: only these attributes - glob pattern, patterns list or function. Defaults to None (all)
+            max_items (int): max items of every container. Defaults to 10
+            max_string (int): max length of strings and reprs. Defaults to 80
+            max_depth (int): max depth of nested containers. Defaults to 3
+            time_budget (Optional[float]): stop the repr of one value after this time (seconds). Defaults to 0.05
+            the other arguments are the arguments of rich.inspect
+        """
+        from ddebug import limitlib
+
+        if obj is rich.inspect:  # rich.inspect(rich.inspect) shows the help of rich.inspect
+            rich.inspect(obj, console=self)
+            return
+        limits = limitlib.LimitedRepr(max_items=max_items, max_string=max_string, max_depth=max_depth,
+                                      time_budget=time_budget)
+        self.print(_bounded_inspect_class()(obj, title=title, help=help, methods=methods, docs=docs or help,
+                                            private=private, dunder=dunder, sort=sort, all=all, value=value,
+                                            include=util.name_filter(include), limits=limits))
 
     def pprint(
             self,
@@ -168,26 +308,134 @@ class Console(rich.console.Console):
             max_string: int = None,
             expand_all: bool = False,
     ):
+        import rich.pretty
         rich.pretty.pprint(_object, console=self, indent_guides=indent_guides, max_length=max_length,
                            max_string=max_string,
                            expand_all=expand_all)
 
-    def dd_format_frames(self, stack, block=None):
-        panels = []
-        for info in stack:
-            if block:
-                if stack.index(info) >= block:
-                    break
-            executing = icecream.Source.executing(info.frame)
-            text = executing.text()
+    def dd_format_frames(self, stack, block=None, compact: bool = False, context: int = 1):
+        """
+        print the frames in rich panel
+
+        Args:
+            stack: the frames (or inspect.FrameInfo objects), the innermost first
+            block: print only the first X frames. Defaults to None
+            compact (bool): one line (location and source line) per frame, without the call text analysis.
+             Defaults to False
+            context (int): if more than 1, print this number of source lines around the line of every frame
+             (like `inspect.stack(context)`) instead of the executing statement. not used if compact. Defaults to 1
+        """
+        import rich.panel
+        import rich.text
+
+        from ddebug import sourcelib
+
+        lines = []
+        for index, info in enumerate(stack):
+            if block and index >= block:
+                break
+            frame = getattr(info, "frame", info)
+            code = frame.f_code
+            if compact:
+                line = sourcelib.source_cache.line(code.co_filename, frame.f_lineno).strip()
+                lines.append(rich.text.Text.assemble(
+                    (os.path.basename(code.co_filename), "yellow"), ":", (str(frame.f_lineno), "blue"), " in ",
+                    (_code_qualname(frame), "bold green"), "  ", line,
+                    no_wrap=True, overflow="ellipsis"))
+                continue
+            import icecream
+
+            executing = icecream.Source.executing(frame)
+            if context > 1:
+                source = sourcelib.source_cache.get(code.co_filename)
+                start = max(frame.f_lineno - 1 - context // 2, 0)
+                text = textwrap.dedent("\n".join(source.lines[start:start + context])) if source is not None else ""
+            else:
+                text = executing.text()
+            text = text or sourcelib.source_cache.line(code.co_filename, frame.f_lineno).strip()
             if text:
-                panels.append(rich.panel.Panel(
+                lines.append(rich.panel.Panel(
                     text,
-                    title=f"\"[yellow]{os.path.basename(info.filename)}\"[/]:[blue]{info.lineno}[/] in [green][b]{executing.code_qualname()}[/b][/]"))
-        panel = rich.panel.Panel(rich.console.Group(*panels), title="ddStack[cyan](dd.print_stack)[/]")
+                    title=f"\"[yellow]{os.path.basename(code.co_filename)}\"[/]:[blue]{frame.f_lineno}[/] in [green][b]{executing.code_qualname()}[/b][/]"))
+        panel = rich.panel.Panel(rich.console.Group(*lines), title="ddStack[cyan](dd.print_stack)[/]")
         self.print(panel)
 
-    def locals(self, sort_keys=False):
+    def stats(self, stats: Dict[Any, util.CallSiteStats]):
+        import rich.table
+
+        table = rich.table.Table(title="dd.stats")
+        table.add_column("call site", style="yellow")
+        table.add_column("hits", justify="right", style="blue")
+        table.add_column("first", style="dim")
+        table.add_column("last", style="dim")
+        table.add_column("argument", style="cyan")
+        table.add_column("min", justify="right")
+        table.add_column("max", justify="right")
+        table.add_column("mean", justify="right")
+
+        def time_string(timestamp):
+            return datetime.datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3]
+
+        for site in sorted(stats.values(), key=lambda site: site.hits, reverse=True):
+            row = [site.location, str(site.hits), time_string(site.first), time_string(site.last)]
+            if not site.numbers:
+                table.add_row(*row, "", "", "", "")
+            for index, (minimum, maximum, total, count) in sorted(site.numbers.items()):
+                name = site.arg_names[index] if index < len(site.arg_names) else str(index)
+                table.add_row(*row, name, repr(minimum), repr(maximum), f"{total / count:.6g}")
+                row = ["", "", "", ""]
+        self.print(table)
+
+    def print_profile(self, result, title: str = "dd.profile", min_percent: float = 1.0):
+        """
+        print the hottest call paths of profilelib.ProfileResult as rich tree
+        """
+        import rich.tree
+
+        total = result.samples
+        tree = rich.tree.Tree(
+            f"[cyan]{title}[/]: {total} samples in {result.duration:.3f}s (every {result.interval * 1000:g}ms)")
+        if not total:
+            self.print(tree)
+            return
+
+        root = {}  # frame -> [count,children]
+        for stack, count in result.stacks.items():
+            children = root
+            for frame in stack:
+                node = children.setdefault(frame, [0, {}])
+                node[0] += count
+                children = node[1]
+
+        def add(parent, children):
+            for (filename, name, line), (count, sub_children) in sorted(children.items(), key=lambda item: -item[1][0]):
+                percent = count * 100 / total
+                if percent < min_percent:
+                    continue
+                branch = parent.add(
+                    f"[blue]{percent:.1f}%[/] [green][b]{name}[/b][/] [yellow]\"{os.path.basename(filename)}\"[/]:{line}")
+                add(branch, sub_children)
+
+        add(tree, root)
+        self.print(tree)
+
+    def locals(self, sort_keys=False, include: Union[None, str, Iterable[str], Callable[[str], bool]] = None,
+               max_items: int = 10, max_string: int = 80, max_depth: int = 3, time_budget: Optional[float] = 0.05):
+        """
+        print the local variables of the caller. the reprs are bounded while they are generated.
+
+        Args:
+            sort_keys (bool): sort the names. Defaults to False
+            include: only these names - glob pattern (e.g. "user_*"), patterns list or function. Defaults to None (all)
+            max_items (int): max items of every container. Defaults to 10
+            max_string (int): max length of strings and reprs. Defaults to 80
+            max_depth (int): max depth of nested containers. Defaults to 3
+            time_budget (Optional[float]): stop the repr of one value after this time (seconds). Defaults to 0.05
+        """
+        from rich.scope import render_scope
+
+        from ddebug import limitlib
+
         frame = inspect.currentframe().f_back
         line = frame.f_lineno
         file = frame.f_code.co_filename
@@ -196,22 +444,40 @@ class Console(rich.console.Console):
         else:
             file = ''
         #
-        if frame.f_locals:
+        included = util.name_filter(include)
+        limits = limitlib.LimitedRepr(max_items=max_items, max_string=max_string, max_depth=max_depth,
+                                      time_budget=time_budget)
+        scope = {name: limitlib.ReprText(_bounded_repr(limits, value))
+                 for name, value in frame.f_locals.items() if included(name)}
+        del frame
+        if scope:
             self.print(render_scope(
-                frame.f_locals,
+                scope,
                 title=f'Local Variables (dd.locals {file}):',
                 indent_guides=True,
-                max_length=10,
-                max_string=80,
                 sort_keys=sort_keys
             ))
 
     def timeit(self, f: Callable = None, setup="pass", timer=timeit.default_timer,
-               number=timeit.default_number, globals_param=..., print_result=True):
+               number=None, globals_param=..., print_result=True, repeat=5, warmup=1, label: str = "",
+               history: Optional[str] = ..., threshold: float = None, raise_on_regression=False):
         if f is None:
             return functools.partial(self.timeit, setup=setup, timer=timer, number=number,
                                      globals_param=globals_param,
-                                     print_result=print_result)
+                                     print_result=print_result, repeat=repeat, warmup=warmup, label=label,
+                                     history=history, threshold=threshold, raise_on_regression=raise_on_regression)
+
+        if inspect.iscoroutinefunction(f) or inspect.isasyncgenfunction(f):
+            @functools.wraps(f)
+            async def async_warp(*args, **kwargs):
+                timeit_result = await timelib.measure_async(functools.partial(f, *args, **kwargs), timer, number,
+                                                            repeat, warmup)
+                self._timeit_report(f, timeit_result, print_result, label, history, threshold, raise_on_regression)
+                async_warp.last_result = timeit_result
+                return float(timeit_result)
+
+            async_warp.last_result = None
+            return async_warp
 
         @functools.wraps(f)
         def warp(*args, **kwargs):
@@ -223,23 +489,97 @@ class Console(rich.console.Console):
             if globals_param is ...:
                 _globals = inspect.currentframe().f_back.f_globals
 
-            timeit_result = timeit.timeit(func, setup, timer, number, _globals)
-            if print_result:
-                text = "{result} - timeit on function {name} - (running {number} times)"
-
-                if self.color_system is not None:
-                    text = (text
-                            .replace("timeit", "[yellow]timeit[/]")
-                            .replace("{name}", "[cyan]{name}[/]")
-                            .replace("{number}", "[green]{number}[/]")
-                            .replace("{result}", "[blue]{result}[/]")
-                            )
-                text = text.format(result=timeit_result, name=f.__name__, number=number)
-                self.print(text)
-            return timeit_result
+            timeit_result = timelib.measure(func, setup, timer, number, repeat, warmup, _globals)
+            self._timeit_report(f, timeit_result, print_result, label, history, threshold, raise_on_regression)
+            warp.last_result = timeit_result
+            return float(timeit_result)
 
+        warp.last_result = None
         return warp
 
+    def _timeit_report(self, f: Callable, timeit_result: timelib.TimeitResult, print_result: bool, label: str,
+                       history: Optional[str], threshold: Optional[float], raise_on_regression: bool):
+        """
+        print the timeit result and save it in the history
+        """
+        if print_result:
+            text = ("timeit on function {name} - min {best}, median {median} ± {stdev}, {ops} ops/s{lag}"
+                    " - (running {repeat} x {number} times{outliers})")
+
+            if self.color_system is not None:
+                text = (text
+                        .replace("timeit", "[yellow]timeit[/]")
+                        .replace("{name}", "[cyan]{name}[/]")
+                        .replace("{number}", "[green]{number}[/]")
+                        .replace("{best}", "[blue]{best}[/]")
+                        .replace("{median}", "[blue]{median}[/]")
+                        )
+            outliers = len(timeit_result.outliers)
+            lag = timeit_result.loop_lag
+            text = text.format(name=f.__name__, best=timelib.format_time(timeit_result.best),
+                               median=timelib.format_time(timeit_result.median),
+                               stdev=timelib.format_time(timeit_result.stdev),
+                               ops=timelib.format_ops(timeit_result.ops_per_second),
+                               lag="" if lag is None else f", event loop lag max {timelib.format_time(lag)}",
+                               repeat=len(timeit_result.times), number=timeit_result.number,
+                               outliers=f", {outliers} outliers" if outliers else "")
+            self.print(text)
+
+        history_file = self.timeit_history if history is ... else history
+        if history_file:
+            self._timeit_history(f, label, timeit_result, history_file, threshold, print_result,
+                                 raise_on_regression)
+
+    def _timeit_history(self, f: Callable, label: str, result: timelib.TimeitResult, history_file: str,
+                        threshold: Optional[float], print_result: bool, raise_on_regression: bool):
+        """
+        compare the result to the baseline in the history file and add it to the history
+        """
+        history = timelib.TimeitHistory(history_file,
+                                        self.timeit_threshold if threshold is None else threshold)
+        name = f"{f.__module__}.{f.__qualname__}"
+        comparison = history.compare(name, label, result)
+        history.add(name, label, result)
+        if comparison is None:
+            if print_result:
+                self.print(f"timeit baseline of {name}{f' [{label}]' if label else ''} saved to {history_file}",
+                           markup=False)
+            return
+        message = (f"timeit on function {f.__name__} - median {timelib.format_time(result.median)} vs baseline "
+                   f"{timelib.format_time(comparison.baseline['median'])}: {comparison.delta:+.1%}")
+        if print_result:
+            if comparison.regression:
+                self.print(f"[red][b]{message} REGRESSION[/b] (threshold {history.threshold:.0%})[/]")
+            else:
+                self.print(f"[green]{message}[/]")
+        if comparison.regression and raise_on_regression:
+            raise timelib.TimeitRegression(f"{message} (threshold {history.threshold:.0%})")
+
+    def timeit_compare(self, *functions: Callable, args: tuple = (), kwargs: dict = None, setup="pass",
+                       timer=timelib.default_timer, number=None, repeat=5, warmup=1,
+                       print_result=True) -> List[timelib.TimeitResult]:
+        import rich.table
+
+        results = [timelib.measure(functools.partial(function, *args, **(kwargs or {})), setup, timer, number, repeat,
+                                   warmup) for function in functions]
+        if print_result:
+            fastest = min(result.median for result in results)
+            table = rich.table.Table(title="dd.timeit_compare")
+            table.add_column("function", style="cyan")
+            for column in ("min", "median", "stdev", "ops/s", "relative", "outliers", "runs"):
+                table.add_column(column, justify="right")
+            for function, result in zip(functions, results):
+                table.add_row(getattr(function, "__name__", repr(function)),
+                              timelib.format_time(result.best),
+                              timelib.format_time(result.median),
+                              timelib.format_time(result.stdev),
+                              timelib.format_ops(result.ops_per_second),
+                              f"{result.median / fastest:.2f}x" if fastest else "-",
+                              str(len(result.outliers)),
+                              f"{len(result.times)} x {result.number}")
+            self.print(table)
+        return results
+
     # color system
     @property
     def color_system(self) -> Optional[str]:
@@ -266,6 +606,131 @@ class Console(rich.console.Console):
             self._color_system = None
 
 
+def _code_qualname(frame) -> str:
+    """
+    the qualified name of the code of frame - co_qualname is python 3.11+, before it executing find it in the source
+    """
+    code = frame.f_code
+    qualname = getattr(code, "co_qualname", None)
+    if qualname is None:
+        import executing
+
+        try:
+            qualname = executing.Source.for_frame(frame).code_qualname(code)
+        except Exception:  # no source
+            qualname = code.co_name
+    return qualname
+
+
+def _bounded_repr(limits, value) -> str:
+    try:
+        return limits.format(value)
+    except Exception as e:
+        return f"<{type(value).__name__} - repr failed: {e!r}>"
+
+
+_bounded_inspect = None
+
+
+def _bounded_inspect_class():
+    """
+    create BoundedInspect (the rich._inspect.Inspect subclass) on first use
+    """
+    global _bounded_inspect
+    if _bounded_inspect is not None:
+        return _bounded_inspect
+    from inspect import isclass, ismodule
+
+    import rich.panel
+    import rich.pretty
+    import rich.table
+    import rich.text
+    from rich._inspect import Inspect
+
+    from ddebug.limitlib import ReprText
+
+    class BoundedInspect(Inspect):
+        """
+        Inspect that show only the included attributes, with bounded reprs (see `Console.inspect`)
+        """
+
+        def __init__(self, obj, *, include: Callable[[str], bool], limits, **kwargs):
+            super().__init__(obj, **kwargs)
+            self.include = include
+            self.limits = limits
+
+        def _pretty(self, value) -> "rich.pretty.Pretty":
+            return rich.pretty.Pretty(ReprText(_bounded_repr(self.limits, value)), highlighter=self.highlighter)
+
+        def _render(self):
+            obj = self.obj
+            keys = dir(obj)
+            total_items = len(keys)
+            keys = [key for key in keys if (self.dunder or not key.startswith("__")) and
+                    (self.private or not key.startswith("_")) and self.include(key)]
+            not_shown_count = total_items - len(keys)
+            items = []
+            for key in keys:
+                try:
+                    items.append((key, None, getattr(obj, key)))
+                except Exception as error:
+                    items.append((key, error, None))
+            if self.sort:
+                items.sort(key=lambda item: (callable(item[2]), item[0].strip("_").lower()))
+
+            if callable(obj):
+                signature = self._get_signature("", obj)
+                if signature is not None:
+                    yield signature
+                    yield ""
+            if self.docs:
+                doc = self._get_formatted_doc(obj)
+                if doc is not None:
+                    yield self.highlighter(rich.text.Text(doc, style="inspect.help"))
+                    yield ""
+            if self.value and not (isclass(obj) or callable(obj) or ismodule(obj)):
+                yield rich.panel.Panel(self._pretty(obj), border_style="inspect.value.border")
+                yield ""
+
+            table = rich.table.Table.grid(padding=(0, 1), expand=False)
+            table.add_column(justify="right")
+            for key, error, value in items:
+                key_text = rich.text.Text.assemble(
+                    (key, "inspect.attr.dunder" if key.startswith("__") else "inspect.attr"), (" =", "inspect.equals"))
+                if error is not None:
+                    key_text.stylize("inspect.error")
+                    table.add_row(key_text, self.highlighter(repr(error)))
+                elif callable(value):
+                    if self.methods:
+                        table.add_row(key_text, self._method(key, value))
+                else:
+                    table.add_row(key_text, self._pretty(value))
+            if table.row_count:
+                yield table
+            elif not_shown_count:
+                yield rich.text.Text(f"{not_shown_count} attribute(s) not shown.", style="italic")
+
+        def _method(self, key: str, value):
+            """
+            the signature and the doc (cut to max_string) of method, like rich.inspect(methods=True)
+            """
+            signature = self._get_signature(key, value)
+            if signature is None:
+                return self._pretty(value)
+            docs = self._get_formatted_doc(value) if self.docs else None
+            if docs is not None:
+                if len(docs) > self.limits.max_string:
+                    docs = docs[:self.limits.max_string] + "..."
+                signature.append("\n" if "\n" in docs else " ")
+                doc = self.highlighter(docs)
+                doc.stylize("inspect.doc")
+                signature.append(doc)
+            return signature
+
+    _bounded_inspect = BoundedInspect
+    return _bounded_inspect
+
+
 if __name__ == '__main__':
     __console = Console()
     __console.diff("r", "r")
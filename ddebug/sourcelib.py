@@ -0,0 +1,263 @@
+"""
+shared source cache for ddebug - the source lines and the syntax-highlight tokens of files,
+keyed by filename and mtime (see `source_cache`)
+"""
+import builtins
+import io
+import os
+import threading
+import types
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import rich.syntax
+import rich.text
+
+_TOKEN_SIZE = 100
+""" estimated memory (bytes) of one cached token """
+
+
+class SourceFile:
+    """
+    one cached file. the lines and the tokens are computed on first use
+    """
+
+    def __init__(self, filename: str, stamp: Tuple[int, int], code: str):
+        """
+        Args:
+            filename (str): the file name
+            stamp (Tuple[int,int]): (mtime_ns,size) of the file when it was read
+            code (str): the file content
+        """
+        self.filename = filename
+        self.stamp = stamp
+        self.code = code
+        self.size = len(code)
+        """ estimated memory (bytes) """
+        self._lines: Optional[List[str]] = None
+        self._tokens: Dict[tuple, Tuple[list, List[str]]] = {}
+
+    @property
+    def lines(self) -> List[str]:
+        """the lines of the file (without the line ends)"""
+        if self._lines is None:
+            self._lines = self.code.splitlines()
+            self.size += len(self._lines) * 8
+        return self._lines
+
+    def line(self, lineno: int) -> str:
+        """
+        Returns:
+            str: the line (1-based), "" if there is no such line
+        """
+        lines = self.lines
+        return lines[lineno - 1] if 0 < lineno <= len(lines) else ""
+
+    def line_tokens(self, key: tuple, code: str, lexer) -> Tuple[list, List[str]]:
+        """
+        the pygments tokens of code (the processed file content) split to lines - computed once for every key
+
+        Args:
+            key (tuple): (lexer name,tab size,dedent) of the rich.syntax.Syntax
+            code (str): the code to tokenize
+            lexer: the pygments lexer
+
+        Returns:
+            Tuple[list,List[str]]: the (token type,text) list of every line, and the text of every line
+        """
+        tokens = self._tokens.get(key)
+        if tokens is None:
+            lines = [[]]
+            for token_type, token in lexer.get_tokens(code):
+                while token:  # one token per line, like rich.syntax.Syntax.highlight
+                    line_token, new_line, token = token.partition("\n")
+                    lines[-1].append((token_type, line_token + new_line))
+                    if new_line:
+                        lines.append([])
+            texts = ["".join(text for _, text in line) for line in lines]
+            tokens = self._tokens[key] = (lines, texts)
+            self.size += len(code) + sum(map(len, lines)) * _TOKEN_SIZE
+        return tokens
+
+
+class SourceCache:
+    """
+    LRU cache of SourceFile objects, bounded by estimated memory. every `get` check the mtime and the size of
+    the file, so changed files are read again.
+    """
+
+    def __init__(self, max_bytes: int = 32 << 20):
+        """
+        init the SourceCache object.
+
+        Args:
+            max_bytes (int): max estimated memory of the cached files. Defaults to 32 MB
+        """
+        self.max_bytes = max_bytes
+        self._files: "OrderedDict[str, SourceFile]" = OrderedDict()
+        self._by_code: Dict[str, SourceFile] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: str) -> Optional[SourceFile]:
+        """
+        Returns:
+            Optional[SourceFile]: the cached file (read again if it changed), None if it can not be read
+        """
+        try:
+            stat = os.stat(filename)
+        except (OSError, ValueError):
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            source = self._files.get(filename)
+            if source is not None and source.stamp == stamp:
+                self._files.move_to_end(filename)
+                return source
+        try:
+            with open(filename, "rt", encoding="utf-8", errors="replace") as f:  # like rich.traceback
+                code = f.read()
+        except OSError:
+            return None
+        source = SourceFile(filename, stamp, code)
+        with self._lock:
+            self._remove(filename)
+            self._files[filename] = source
+            self._by_code[code] = source
+            self._evict()
+        return source
+
+    def by_code(self, code: str) -> Optional[SourceFile]:
+        """
+        Returns:
+            Optional[SourceFile]: the cached file with this content, or None
+        """
+        with self._lock:
+            return self._by_code.get(code)
+
+    def line(self, filename: str, lineno: int) -> str:
+        """
+        Returns:
+            str: the line (1-based) of the file, "" if it can not be read
+        """
+        source = self.get(filename)
+        return source.line(lineno) if source is not None else ""
+
+    def clear(self):
+        """remove all the cached files"""
+        with self._lock:
+            self._files.clear()
+            self._by_code.clear()
+
+    def _remove(self, filename: str):
+        source = self._files.pop(filename, None)
+        if source is not None and self._by_code.get(source.code) is source:
+            del self._by_code[source.code]
+
+    def _evict(self):
+        total = sum(source.size for source in self._files.values())
+        while total > self.max_bytes and len(self._files) > 1:
+            filename, source = next(iter(self._files.items()))
+            total -= source.size
+            self._remove(filename)
+
+
+source_cache = SourceCache()
+""" the shared cache of ddebug """
+
+
+class CachedSyntax(rich.syntax.Syntax):
+    """
+    rich.syntax.Syntax that take the tokens of file content from `source_cache` (instead of tokenizing the file
+    from its start on every render). used by the tracebacks of ddebug (see `traceback_class`).
+    falls back to rich.syntax.Syntax.highlight if the (private) rich attributes it use are missing.
+    """
+
+    def highlight(self, code: str, line_range=None) -> rich.text.Text:
+        try:
+            return self._cached_highlight(code, line_range)
+        except AttributeError:  # other rich version
+            return super().highlight(code, line_range)
+
+    def _cached_highlight(self, code: str, line_range) -> rich.text.Text:
+        source = source_cache.by_code(self.code) if line_range and isinstance(self._lexer, str) else None
+        lexer = self.lexer if source is not None else None
+        if lexer is None:
+            return super().highlight(code, line_range)
+        lines, texts = source.line_tokens((self._lexer, self.tab_size, self.dedent), code, lexer)
+        base_style = self._get_base_style()
+        text = rich.text.Text(justify="default" if base_style.transparent_background else "left", style=base_style,
+                              tab_size=self.tab_size, no_wrap=not self.word_wrap)
+        line_start, line_end = line_range
+        start = max(0, line_start - 1) if line_start else 0
+        prefix = "".join(texts[:start])  # unstyled - rich cut it by the line range
+        if prefix:
+            text.append(prefix)
+        get_style = self._theme.get_style_for_token
+        text.append_tokens((token, get_style(token_type)) for line in lines[start:line_end]
+                           for token_type, token in line)
+        if self.background_color is not None:
+            text.stylize(f"on {self.background_color}")
+        if getattr(self, "_stylized_ranges", None):
+            self._apply_stylized_ranges(text)
+        return text
+
+
+def _cached_open(file, *args, **kwargs):
+    """
+    open for rich.traceback - the files of source_cache are read from memory
+    """
+    source = source_cache.get(file)
+    if source is None:
+        return builtins.open(file, *args, **kwargs)
+    return io.StringIO(source.code)
+
+
+_traceback_class = None
+
+
+def traceback_class():
+    """
+    create (on first use) rich.traceback.Traceback subclass that render the source lines and the tokens of
+    source_cache (with `CachedSyntax`). only ddebug's tracebacks use it - rich.traceback itself is not changed.
+
+    Returns:
+        the subclass, or rich.traceback.Traceback if this rich version has no `_render_stack` to copy
+    """
+    global _traceback_class
+    if _traceback_class is not None:
+        return _traceback_class
+    import rich.console
+    import rich.traceback
+
+    render_stack = getattr(getattr(rich.traceback.Traceback, "_render_stack", None), "__wrapped__", None)
+    if render_stack is None or render_stack.__code__.co_freevars:
+        _traceback_class = rich.traceback.Traceback
+        return _traceback_class
+    # the same code with other globals - Syntax and open (of the nested read_code) are looked up in them
+    namespace = dict(vars(rich.traceback), Syntax=CachedSyntax, open=_cached_open)
+    cached_render_stack = types.FunctionType(render_stack.__code__, namespace, render_stack.__name__,
+                                             render_stack.__defaults__)
+
+    class CachedTraceback(rich.traceback.Traceback):
+        """
+        rich.traceback.Traceback that render the source from `source_cache`
+        """
+        _render_stack = rich.console.group()(cached_render_stack)
+
+    _traceback_class = CachedTraceback
+    return _traceback_class
+
+
+def cache_exception(exc_value: BaseException, tb=None):
+    """
+    read (or validate) the files of the traceback frames (also of the chained exceptions) in source_cache,
+    before rich.traceback render them
+    """
+    seen = set()
+    while exc_value is not None and id(exc_value) not in seen:
+        seen.add(id(exc_value))
+        tb = tb or exc_value.__traceback__
+        while tb is not None:
+            source_cache.get(tb.tb_frame.f_code.co_filename)
+            tb = tb.tb_next
+        exc_value = exc_value.__cause__ or (None if exc_value.__suppress_context__ else exc_value.__context__)
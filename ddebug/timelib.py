@@ -0,0 +1,288 @@
+"""
+benchmark part of ddebug (dd.timeit)
+"""
+import asyncio
+import inspect
+import json
+import os
+import statistics
+import time
+import timeit
+from timeit import default_timer
+from typing import Callable, List, NamedTuple, Optional
+
+
+class TimeitResult(float):
+    """
+    the best total time of `number` runs (like timeit.timeit returns) with the statistics of all the repeats.
+    `dd.timeit` return it as float and keep it in the `last_result` attribute of the wrapped function.
+    """
+
+    def __new__(cls, times: List[float], number: int):
+        """
+        Args:
+            times (List[float]): the time of one run (seconds) in every repeat
+            number (int): number of runs in every repeat
+        """
+        self = super().__new__(cls, min(times) * number)
+        self.times = times
+        self.number = number
+        self.loop_lag: Optional[float] = None
+        """ the longest time (seconds) the event loop was blocked while timing coroutine function, else None """
+        return self
+
+    @property
+    def best(self) -> float:
+        """the fastest time of one run (seconds)"""
+        return min(self.times)
+
+    @property
+    def median(self) -> float:
+        """the median time of one run (seconds)"""
+        return statistics.median(self.times)
+
+    @property
+    def stdev(self) -> float:
+        """the standard deviation of the time of one run (seconds)"""
+        return statistics.stdev(self.times) if len(self.times) > 1 else 0.0
+
+    @property
+    def ops_per_second(self) -> float:
+        """number of runs per second (by the median time)"""
+        return 1 / self.median if self.median else float("inf")
+
+    @property
+    def outliers(self) -> List[float]:
+        """the repeats times that are outside the Tukey fences (1.5 IQR from the quartiles)"""
+        if len(self.times) < 4:
+            return []
+        q1, _, q3 = statistics.quantiles(self.times, n=4)
+        low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        return [t for t in self.times if t < low or t > high]
+
+    def __repr__(self):
+        return f"TimeitResult({float(self)!r}, number={self.number}, repeat={len(self.times)})"
+
+
+class TimeitRegression(AssertionError):
+    """
+    Exception that Raise by dd.timeit(raise_on_regression=True) when the function is slower than the baseline.
+    """
+
+
+class Comparison(NamedTuple):
+    """
+    comparison of timeit result to the baseline in the history
+    """
+    baseline: dict
+    """ the baseline record """
+    delta: float
+    """ (median - baseline median) / baseline median """
+    regression: bool
+    """ True if delta is above the threshold """
+
+
+class TimeitHistory:
+    """
+    JSON Lines file of timeit results. the first result of every function and label is the baseline.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.1):
+        """
+        init the TimeitHistory object.
+
+        Args:
+            path (str): the history file
+            threshold (float): relative slowdown (of the median) that counts as regression. Defaults to 0.1 (10%)
+        """
+        self.path = path
+        self.threshold = threshold
+
+    def records(self, name: str = None, label: str = None) -> List[dict]:
+        """
+        read the records of the history (oldest first)
+
+        Args:
+            name (str): if not None return only the records of this function
+            label (str): if not None return only the records with this label
+        """
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:  # half written line
+                    continue
+                if (name is None or record.get("name") == name) and (label is None or record.get("label") == label):
+                    records.append(record)
+        return records
+
+    def baseline(self, name: str, label: str = "") -> Optional[dict]:
+        """
+        Returns:
+            Optional[dict]: the first record of the function with the label, None if there is no record
+        """
+        records = self.records(name, label)
+        return records[0] if records else None
+
+    def compare(self, name: str, label: str, result: TimeitResult) -> Optional[Comparison]:
+        """
+        compare result to the baseline
+
+        Returns:
+            Optional[Comparison]: the comparison, None if there is no baseline
+        """
+        baseline = self.baseline(name, label)
+        if baseline is None or not baseline["median"]:
+            return None
+        delta = (result.median - baseline["median"]) / baseline["median"]
+        return Comparison(baseline, delta, delta > self.threshold)
+
+    def add(self, name: str, label: str, result: TimeitResult) -> dict:
+        """
+        append result to the history
+
+        Returns:
+            dict: the new record
+        """
+        record = {"name": name, "label": label, "time": time.time(), "median": result.median, "best": result.best,
+                  "stdev": result.stdev, "number": result.number, "repeat": len(result.times)}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        return record
+
+
+def measure(func: Callable, setup="pass", timer=default_timer, number: int = None, repeat: int = 5,
+            warmup: int = 1, globals_param: dict = None) -> TimeitResult:
+    """
+    run func in loop `repeat` times and return the statistics
+
+    Args:
+        func (Callable): the function to time
+        setup: setup statement or function for timeit.Timer. Defaults to "pass"
+        timer: timer function. Defaults to default_timer
+        number (int): number of runs in every repeat. if None it auto-range it to at least 0.2 seconds. Defaults to None
+        repeat (int): number of repeats. Defaults to 5
+        warmup (int): number of runs before the timing. Defaults to 1
+        globals_param (dict): globals for the setup statement. Defaults to None
+
+    Returns:
+        TimeitResult: the result
+    """
+    timer_obj = timeit.Timer(func, setup, timer, globals_param)
+    if warmup:
+        timer_obj.timeit(warmup)
+    if number is None:
+        number, _ = timer_obj.autorange()
+    totals = timer_obj.repeat(repeat, number)
+    return TimeitResult([total / number for total in totals], number)
+
+
+class _LoopLagMonitor:
+    """
+    task that sleep `interval` again and again and record how late it woke up (how long the event loop was blocked)
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._loop = asyncio.get_running_loop()
+        self._sleep_start = self._loop.time()
+        self._task = self._loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._sleep_start = self._loop.time()
+            await asyncio.sleep(self.interval)
+            self._record()
+
+    def _record(self):
+        self.max_lag = max(self.max_lag, self._loop.time() - self._sleep_start - self.interval)
+
+    def stop(self) -> float:
+        """
+        Returns:
+            float: the max lag (seconds)
+        """
+        self._task.cancel()
+        self._record()  # the last sleep
+        return self.max_lag
+
+
+async def _consume(awaitable):
+    """
+    await the result of coroutine function, or iterate it for async generator
+    """
+    if inspect.isasyncgen(awaitable):
+        async for _ in awaitable:
+            pass
+    else:
+        await awaitable
+
+
+async def measure_async(func: Callable, timer=default_timer, number: int = None, repeat: int = 5,
+                        warmup: int = 1, lag_interval: float = 0.001) -> TimeitResult:
+    """
+    like `measure` for coroutine function (or async generator function). run it on the running event loop,
+    and record the event loop lag (in TimeitResult.loop_lag).
+
+    Args:
+        func (Callable): the coroutine function to time (without arguments)
+        timer: timer function. Defaults to default_timer
+        number (int): number of runs in every repeat. if None it auto-range it to at least 0.2 seconds. Defaults to None
+        repeat (int): number of repeats. Defaults to 5
+        warmup (int): number of runs before the timing. Defaults to 1
+        lag_interval (float): sleep interval of the lag monitor task. Defaults to 0.001
+
+    Returns:
+        TimeitResult: the result (wall time)
+    """
+
+    async def run(n: int) -> float:
+        start = timer()
+        for _ in range(n):
+            await _consume(func())
+        return timer() - start
+
+    monitor = _LoopLagMonitor(lag_interval)
+    try:
+        await run(warmup)
+        if number is None:  # like timeit.Timer.autorange
+            i = 1
+            while True:
+                for j in 1, 2, 5:
+                    number = i * j
+                    if await run(number) >= 0.2:
+                        break
+                else:
+                    i *= 10
+                    continue
+                break
+        totals = [await run(number) for _ in range(repeat)]
+    finally:
+        loop_lag = monitor.stop()
+    result = TimeitResult([total / number for total in totals], number)
+    result.loop_lag = loop_lag
+    return result
+
+
+def format_time(seconds: float) -> str:
+    """
+    format seconds with unit (ns,µs,ms,s)
+    """
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def format_ops(ops: float) -> str:
+    """
+    format number of operations per second (k,M,G)
+    """
+    for unit, scale in (("G", 1e9), ("M", 1e6), ("k", 1e3)):
+        if ops >= scale:
+            return f"{ops / scale:.3g}{unit}"
+    return f"{ops:.3g}"
@@ -0,0 +1,351 @@
+"""
+binary trace recording for ddebug (dd.record_trace). render the trace later with `python -m ddebug.replay`
+"""
+import functools
+import inspect
+import struct
+import sys
+import threading
+import time
+import types
+from typing import BinaryIO, Callable, Iterator, List, NamedTuple, Tuple, Union
+
+from cheap_repr import cheap_repr
+
+MAGIC = b"DDTRACE2"
+_MAGIC_V1 = b"DDTRACE1"  # without threads
+
+CALL, LINE, RETURN, EXCEPTION, ENTER, EXIT = range(6)
+
+_CODE_RECORD = b"C"
+_EVENT_RECORD = b"E"
+_THREAD_RECORD = b"T"
+
+_header_struct = struct.Struct("<d")  # start time
+_code_struct = struct.Struct("<I")  # code id
+_thread_struct = struct.Struct("<I")  # thread id
+_event_struct = struct.Struct("<BIIIdH")  # kind,thread id,code id,line number,time from start,number of variables
+_event_struct_v1 = struct.Struct("<BIIdH")
+_str_struct = struct.Struct("<I")  # string length
+
+
+class TraceEvent(NamedTuple):
+    """
+    one event read from a trace file
+    """
+    kind: int
+    filename: str
+    name: str
+    lineno: int
+    time: float
+    """ the event time (seconds since the epoch) """
+    variables: Tuple[Tuple[str, str], ...]
+    """ (name,repr) of the variables that changed since the previous event """
+    thread: str = ""
+    """ the name of the thread """
+
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode("utf-8", "replace")
+    return _str_struct.pack(len(data)) + data
+
+
+def traced_step(trace_function: Callable) -> Callable:
+    """
+    create step function (for `wrap_async`) that run one step of coroutine with trace_function as the trace function
+    """
+
+    def step(method, value):
+        previous = sys.gettrace()
+        sys.settrace(trace_function)
+        try:
+            return method(value)
+        finally:
+            sys.settrace(previous)
+
+    return step
+
+
+@types.coroutine
+def _traced_await(awaitable, step: Callable):
+    """
+    await awaitable, and run every step (until the next await point) by step(method,value)
+    """
+    iterator = awaitable.__await__()
+    method, incoming = iterator.send, None
+    while True:
+        try:
+            outgoing = step(method, incoming)
+        except StopIteration as e:
+            return e.value
+        try:
+            incoming = yield outgoing
+            method = iterator.send
+        except GeneratorExit:
+            iterator.close()
+            raise
+        except BaseException as e:  # e.g. asyncio.CancelledError
+            method, incoming = iterator.throw, e
+
+
+def wrap_async(function: Callable, step: Callable) -> Callable:
+    """
+    wrap coroutine function or async generator function so every step between await points
+    run by step(method,value) (see `traced_step`)
+
+    Args:
+        function (Callable): `async def` function
+        step (Callable): step function
+
+    Returns:
+        Callable: the wrapper
+    """
+    if inspect.isasyncgenfunction(function):
+        @functools.wraps(function)
+        async def async_generator_wrapper(*args, **kwargs):
+            agen = function(*args, **kwargs)
+            method, incoming = agen.asend, None
+            while True:
+                try:
+                    outgoing = await _traced_await(method(incoming), step)
+                except StopAsyncIteration:
+                    return
+                try:
+                    incoming = yield outgoing
+                    method = agen.asend
+                except GeneratorExit:
+                    await agen.aclose()
+                    raise
+                except BaseException as e:
+                    method, incoming = agen.athrow, e
+
+        return async_generator_wrapper
+
+    @functools.wraps(function)
+    async def coroutine_wrapper(*args, **kwargs):
+        return await _traced_await(function(*args, **kwargs), step)
+
+    return coroutine_wrapper
+
+
+def is_async_function(function) -> bool:
+    """
+    Returns:
+        bool: True if function is coroutine function or async generator function
+    """
+    return inspect.iscoroutinefunction(function) or inspect.isasyncgenfunction(function)
+
+
+class TraceRecorder:
+    """
+    record raw trace events (thread id,code id,line number,changed variables reprs and time) into a compact binary
+    file. can be used like snoop: as decorator and as `with` block, also from many threads.
+    """
+
+    def __init__(self, file: Union[str, BinaryIO]):
+        """
+        init the TraceRecorder object.
+
+        Args:
+            file (Union[str,BinaryIO]): path or binary file to write the trace to
+        """
+        if isinstance(file, str):
+            file = open(file, "wb", buffering=1 << 16)
+        self.file = file
+        self.enabled = True
+        self._start = time.time()
+        self._clock_start = time.perf_counter()
+        self._code_ids = {}
+        self._thread_count = 0
+        self._thread = threading.local()
+        self._lock = threading.Lock()
+        """ the records of every event are written together - events of other threads can not split them """
+        self._target_codes = set()
+        self._frames_locals = {}
+        self._with = threading.local()
+        self._write_header()
+
+    def __call__(self, function):
+        """
+        decorator for record every call of the function
+        """
+        self._target_codes.add(function.__code__)
+        if is_async_function(function):
+            trace_step = traced_step(self._global_trace)
+
+            def step(method, value):
+                return trace_step(method, value) if self.enabled else method(value)
+
+            return wrap_async(function, step)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return function(*args, **kwargs)
+            old_trace = sys.gettrace()
+            sys.settrace(self._global_trace)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                sys.settrace(old_trace)
+
+        return wrapper
+
+    def __enter__(self, context: int = 0):
+        """
+        start record the calling frame
+
+        Args:
+            context (int): number of frames between the `with` block and this function. Defaults to 0
+        """
+        if not self.enabled:
+            self._with_stack.append(None)
+            return
+        frame = sys._getframe(context + 1)  # noqa
+        self._with_stack.append((frame, sys.gettrace()))
+        self._frames_locals[frame] = self._reprs(frame)
+        self._write_event(ENTER, frame, ())
+        frame.f_trace = self._local_trace
+        sys.settrace(self._global_trace)
+
+    def __exit__(self, exc_type, exc_val, exc_tb, context: int = 0):
+        """
+        stop record the calling frame
+        """
+        entry = self._with_stack.pop()
+        if entry is None:
+            return
+        frame, old_trace = entry
+        sys.settrace(old_trace)
+        frame.f_trace = None
+        self._write_event(EXIT, frame, self._changed(frame))
+        self._frames_locals.pop(frame, None)
+
+    @property
+    def _with_stack(self) -> List[tuple]:
+        """
+        the (frame,previous trace function) of the `with` blocks of the current thread
+        """
+        stack = getattr(self._with, "stack", None)
+        if stack is None:
+            stack = self._with.stack = []
+        return stack
+
+    def _write_header(self):
+        self.file.write(MAGIC + _header_struct.pack(self._start))
+
+    def close(self):
+        """flush and close the trace file"""
+        if not self.file.closed:
+            self.file.close()
+
+    def _global_trace(self, frame, event, _arg):
+        if event == "call" and frame.f_code in self._target_codes:
+            self._frames_locals[frame] = reprs = self._reprs(frame)
+            self._write_event(CALL, frame, tuple(reprs.items()))
+            return self._local_trace
+        return None
+
+    def _local_trace(self, frame, event, arg):
+        if event == "line":
+            self._write_event(LINE, frame, self._changed(frame))
+        elif event == "return":
+            variables = self._changed(frame) + (("<return>", cheap_repr(arg)),)
+            self._write_event(RETURN, frame, variables)
+            self._frames_locals.pop(frame, None)
+        elif event == "exception":
+            exc_type, exc_value, _tb = arg
+            self._write_event(EXCEPTION, frame, (("<exception>", f"{exc_type.__name__}: {exc_value}"),))
+        return self._local_trace
+
+    @staticmethod
+    def _reprs(frame) -> dict:
+        return {name: cheap_repr(value) for name, value in frame.f_locals.items()}
+
+    def _changed(self, frame) -> Tuple[Tuple[str, str], ...]:
+        reprs = self._reprs(frame)
+        last = self._frames_locals.get(frame, {})
+        self._frames_locals[frame] = reprs
+        return tuple((name, value) for name, value in reprs.items() if last.get(name) != value)
+
+    def _write_event(self, kind: int, frame, variables: Tuple[Tuple[str, str], ...]):
+        code = frame.f_code
+        record = []
+        for name, value in variables:
+            record.append(_pack_str(name))
+            record.append(_pack_str(value))
+        with self._lock:
+            if self.file.closed:
+                return
+            thread_id = getattr(self._thread, "id", None)
+            if thread_id is None:  # a thread.local - new thread objects never reuse the id of finished threads
+                thread_id = self._thread.id = self._thread_count
+                self._thread_count += 1
+                self.file.write(_THREAD_RECORD + _thread_struct.pack(thread_id) +
+                                _pack_str(threading.current_thread().name))
+            code_id = self._code_ids.get(code)
+            if code_id is None:
+                code_id = self._code_ids[code] = len(self._code_ids)
+                self.file.write(_CODE_RECORD + _code_struct.pack(code_id) + _pack_str(code.co_filename) +
+                                _pack_str(code.co_name))
+            event = _event_struct.pack(kind, thread_id, code_id, frame.f_lineno or 0,
+                                       time.perf_counter() - self._clock_start, len(variables))
+            self.file.write(_EVENT_RECORD + event + b"".join(record))
+
+
+def read_trace(file: Union[str, BinaryIO]) -> Iterator[TraceEvent]:
+    """
+    read the events from a trace file recorded by TraceRecorder
+
+    Args:
+        file (Union[str,BinaryIO]): path or binary file of the trace
+
+    Returns:
+        Iterator[TraceEvent]: the events
+    """
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            yield from read_trace(f)
+        return
+
+    def read(size):
+        data = file.read(size)
+        if len(data) != size:
+            raise EOFError("truncated trace file")
+        return data
+
+    def read_str():
+        (length,) = _str_struct.unpack(read(_str_struct.size))
+        return read(length).decode("utf-8", "replace")
+
+    magic = file.read(len(MAGIC))
+    if magic not in (MAGIC, _MAGIC_V1):
+        raise ValueError("not a ddebug trace file")
+    (start,) = _header_struct.unpack(read(_header_struct.size))
+    codes = {}
+    threads = {0: ""}
+    while True:
+        record_type = file.read(1)
+        if not record_type:
+            return
+        try:
+            if record_type == _CODE_RECORD:
+                (code_id,) = _code_struct.unpack(read(_code_struct.size))
+                codes[code_id] = (read_str(), read_str())
+            elif record_type == _THREAD_RECORD:
+                (thread_id,) = _thread_struct.unpack(read(_thread_struct.size))
+                threads[thread_id] = read_str()
+            elif record_type == _EVENT_RECORD:
+                if magic == MAGIC:
+                    kind, thread_id, code_id, lineno, offset, n_variables = _event_struct.unpack(
+                        read(_event_struct.size))
+                else:
+                    thread_id = 0
+                    kind, code_id, lineno, offset, n_variables = _event_struct_v1.unpack(read(_event_struct_v1.size))
+                variables = tuple((read_str(), read_str()) for _ in range(n_variables))
+                filename, name = codes[code_id]
+                yield TraceEvent(kind, filename, name, lineno, start + offset, variables, threads[thread_id])
+            else:
+                raise ValueError(f"unknown record type {record_type!r}")
+        except EOFError:  # the traced process was killed while writing
+            return
@@ -1,19 +1,43 @@
 """
 watch for ddebug (dd.watch,dd.unwatch)
 """
+import ast
+import collections
+import copy
 import importlib
 import sys
+import threading
+import types
+from types import FrameType
+from typing import Callable, List, Set
 
 from .dd_util import DependencyMissing
 
-try:
-    import watchpoints.watch_print
-except ImportError:
-    watchpoints = None
+enable = True
+sampler = None
+"""
+dd.sample sampler (dd_util.Sampler) or None
+"""
+file = sys.stderr
+"""
+the watch output stream (dd.watch_stream)
+"""
+json_sink = None
+"""
+dd.json_output sink (jsonlib.JsonSink) or None
+"""
+flight_recorder = None
+"""
+dd.flight_recorder (flightlib.FlightRecorder) or None
+"""
+_watch = None
 
-if watchpoints:
-    enable = True
 
+def _watch_callback_class():
+    """
+    create WatchCallBack (the watchpoints.watch_print.WatchPrint subclass)
+    """
+    import watchpoints.watch_print
 
     class WatchCallBack(watchpoints.watch_print.WatchPrint):
         """
@@ -21,51 +45,690 @@ if watchpoints:
         """
         def __init__(self, file=sys.stderr, stack_limit=None,custom_printer=None):
             super().__init__(file, stack_limit)
-            self.source_printer = self.printer
-            self.printer = self._printer
 
         def __call__(self, _frame, elem, exec_info):
-            _file_string = f"Watch trigger ::: File \"{exec_info[1]}\", line {exec_info[2]}, in {exec_info[0]}"
-            p = self.printer
-            p(_file_string)
-            alias = "error:cant find variable name"
-            if elem.alias:
-                # p(f"{elem.alias}:")
-                alias = elem.alias
-            elif elem.default_alias:
-                # p(f"{elem.default_alias}:")
-                alias = elem.default_alias
-            print_format = "\t{}:was {} is now {} "
-            p(print_format.format(alias, repr(elem.prev_obj), repr(elem.obj)))
-
-        def _printer(self, obj):
-            if enable:
-                self.source_printer(obj)
-
-
-    # replace `WatchPrint` by `WatchCallBack`.
-    # watchpoints.watch.config() # TODO
-    importlib.import_module("watchpoints.watch").WatchPrint = WatchCallBack
-    watch = watchpoints.watch
-else:
-    def watch(*_args, **_kwargs):
-        """
-        raise DependencyMissing
+            report(elem, exec_info, self.printer)
+
+    return WatchCallBack
+
+
+def _stream_print(message: str, stream=None):
+    stream = file if stream is None else stream
+    if isinstance(stream, str):
+        with open(stream, "a") as f:
+            print(message, file=f)
+    else:
+        print(message, file=stream)
+
+
+def report(elem, exec_info, printer: Callable[[str], None] = None):
+    """
+    output one watch trigger - to the flight recorder, the json sink or the watch stream
+
+    Args:
+        elem: the watch element (with alias,default_alias,prev_obj and obj)
+        exec_info: (function name,file name,line number) of the line that changed the value
+        printer (Callable[[str],None]): print function. Defaults to None (print to `file`)
+    """
+    if sampler is not None and not sampler((exec_info[1], exec_info[2])):
+        return
+    if not enable:
+        return
+    alias = elem.alias or elem.default_alias or "error:cant find variable name"
+    if flight_recorder is not None:
+        flight_recorder.record("watch", f"{exec_info[1]}:{exec_info[2]} in {exec_info[0]}()",
+                               f"{alias}: was {elem.prev_obj!r} is now {elem.obj!r}")
+        return
+    if json_sink is not None:
+        json_sink.emit("watch", "watch", file=exec_info[1], line=exec_info[2], function=exec_info[0],
+                       alias=alias, was=repr(elem.prev_obj), now=repr(elem.obj))
+        return
+    printer = printer or _stream_print
+    printer(f"Watch trigger ::: File \"{exec_info[1]}\", line {exec_info[2]}, in {exec_info[0]}")
+    printer("\t{}:was {} is now {} ".format(alias, repr(elem.prev_obj), repr(elem.obj)))
+
+
+_MISSING = object()
+_SIZED_TYPES = (list, dict, set, bytearray, collections.deque)
+_OPTIONS = {"alias", "callback", "when", "deepcopy", "cmp", "copy", "file", "intercept"}
+""" the dd.watch options of the ddebug engine. other options (e.g. track,stack_limit) use watchpoints """
+
+_code_names_cache = {}
+
+
+def _code_names(code) -> frozenset:
+    """
+    all the names that code object can use (globals,attributes,locals and closure variables)
+    """
+    names = _code_names_cache.get(code)
+    if names is None:
+        names = _code_names_cache[code] = frozenset(code.co_names + code.co_varnames + code.co_cellvars +
+                                                    code.co_freevars)
+    return names
+
+
+def _root_names(node) -> Set[str]:
+    """
+    the variable and attribute names in the expression node
+    """
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            names.add(child.id)
+        elif isinstance(child, ast.Attribute):
+            names.add(child.attr)
+    return names
+
+
+def _differ(prev, value, cmp: Callable = None) -> bool:
+    """
+    compare values like watchpoints: cmp(prev,value) if given, else by `==` (or `__dict__` if there is no __eq__)
+    """
+    if type(prev) is not type(value):
+        return True
+    if cmp:
+        return cmp(prev, value)
+    if type(value).__module__ == "builtins":
+        return prev != value
+    guess = value.__eq__(prev)
+    if guess is NotImplemented:
+        return getattr(prev, "__dict__", None) != getattr(value, "__dict__", None)
+    return not guess
+
+
+def _eval(node, frame):
+    if sys.version_info < (3, 9) and isinstance(node, ast.Index):  # subscripts are wrapped before python 3.9
+        node = node.value
+    return eval(compile(ast.Expression(node), frame.f_code.co_filename, "eval"), frame.f_globals, frame.f_locals)
+
+
+def _source_text(frame: FrameType, node: ast.expr) -> str:
+    """
+    the source text of node (of the executing tree of frame) - ast.unparse does not exist before python 3.9
+    """
+    import executing
+
+    return executing.Source.for_frame(frame).asttokens().get_text(node)
+
+
+class WatchElement:
+    """
+    one watched value: variable, attribute, item or just an object (with the watchpoints WatchElement attributes
+    that `report` and callbacks use - alias,default_alias,obj and prev_obj)
+    """
+
+    def __init__(self, frame: FrameType, node: ast.expr, value, alias: str = None, callback: Callable = None,
+                 when: Callable = None, deepcopy: bool = False, cmp: Callable = None, copy: Callable = None,
+                 file=None):
+        self.frame = frame
+        self.code = frame.f_code
+        self.frame_globals = frame.f_globals
+        self.alias = alias
+        self.default_alias = _source_text(frame, node)
+        self.callback = callback
+        self.when = when
+        self.deepcopy = deepcopy
+        self.cmp = cmp
+        self.copy = copy
+        self.file = file
+        self.names = _root_names(node)
+        self.local_name = None
+        """ name of local variable of function frame """
+        self.global_name = None
+        self.parent = self.key = self.attr = None
+        if isinstance(node, ast.Name):
+            if frame.f_locals is frame.f_globals or node.id not in frame.f_locals:
+                self.global_name = node.id
+            else:
+                self.local_name = node.id
+        elif isinstance(node, ast.Attribute):
+            self.parent = _eval(node.value, frame)
+            self.attr = node.attr
+        elif isinstance(node, ast.Subscript):
+            self.parent = _eval(node.value, frame)
+            self.key = _eval(node.slice, frame)
+        self.obj = value
+        self.prev_obj = self._copy(value)
+
+    def matches(self, code) -> bool:
+        """
+        True if frames of code may change the value (so they should be checked)
+        """
+        if code is self.code:
+            return True
+        if self.local_name is not None:  # only closures can change local variable
+            return self.local_name in code.co_freevars
+        return not self.names.isdisjoint(_code_names(code))
+
+    def read(self):
+        """
+        the current value (_MISSING if it was deleted)
+        """
+        if self.local_name is not None:
+            return self.frame.f_locals.get(self.local_name, _MISSING)
+        if self.global_name is not None:
+            return self.frame_globals.get(self.global_name, _MISSING)
+        if self.attr is not None:
+            return getattr(self.parent, self.attr, _MISSING)
+        if self.parent is not None:
+            try:
+                return self.parent[self.key]
+            except (LookupError, TypeError):
+                return _MISSING
+        return self.obj
+
+    def changed(self) -> bool:
+        """
+        check (and update) the value. cheap checks (identity,immutable copy and size) run before the full comparison.
+
+        Returns:
+            bool: True if it changed
+        """
+        value = self.read()
+        if value is _MISSING:
+            return False
+        prev = self.prev_obj
+        if value is self.obj:
+            if value is prev:  # copy returned the same object - immutable
+                return False
+        else:
+            self.obj = value
+        if type(value) in _SIZED_TYPES and type(prev) is type(value) and len(value) != len(prev):
+            return True
+        if value is prev:
+            return False
+        return self._differ(prev, value)
+
+    def _differ(self, prev, value) -> bool:
+        return _differ(prev, value, self.cmp)
+
+    def _copy(self, value):
+        if self.copy:
+            return self.copy(value)
+        if self.deepcopy:
+            return copy.deepcopy(value)
+        return copy.copy(value)
+
+    def update(self):
+        """the current value is the new previous value"""
+        self.prev_obj = self._copy(self.obj)
+
+    def same(self, other) -> bool:
+        """True if other is the watched object or the alias"""
+        if type(other) is str and self.alias:
+            return self.alias == other
+        return other is self.obj
+
+
+class _Deleted:
+    def __repr__(self):
+        return "<deleted>"
+
+
+_DELETED = _Deleted()
+
+
+class InterceptElement:
+    """
+    instance (or one attribute of it) watched by dd.watch(..., intercept=True)
+    """
+
+    def __init__(self, instance, attr: str, default_alias: str, alias: str = None, callback: Callable = None,
+                 when: Callable = None, cmp: Callable = None, file=None):
+        self.instance = instance
+        self.attr = attr
+        """ the watched attribute, None for all the attributes """
+        self.alias = alias
+        self.default_alias = default_alias
+        self.callback = callback
+        self.when = when
+        self.cmp = cmp
+        self.file = file
+        self.obj = getattr(instance, attr, _DELETED) if attr else instance
+        self.prev_obj = self.obj
+
+    def same(self, other) -> bool:
+        """True if other is the watched instance, the watched attribute value or the alias"""
+        if type(other) is str and self.alias:
+            return self.alias == other
+        return other is self.instance or other is self.obj
+
+    def changed(self, name: str, prev, value, frame: FrameType):
+        """
+        report attribute change (if it is watched and the value changed)
+        """
+        if self.attr is not None and name != self.attr:
+            return
+        if prev is value or (prev is not _DELETED and value is not _DELETED and not _differ(prev, value, self.cmp)):
+            return
+        if self.when and not self.when(value):
+            return
+        if self.attr is None:
+            elem = types.SimpleNamespace(alias=self.alias and f"{self.alias}.{name}",
+                                         default_alias=f"{self.default_alias}.{name}", prev_obj=prev, obj=value)
+        else:
+            self.prev_obj, self.obj = prev, value
+            elem = self
+        exec_info = (frame.f_code.co_name, frame.f_code.co_filename, frame.f_lineno)
+        if self.callback:
+            self.callback(frame, elem, exec_info)
+        else:
+            report(elem, exec_info, (lambda message: _stream_print(message, self.file))
+                   if self.file is not None else None)
+
+
+class _ClassPatch:
+    """
+    the replaced __setattr__ and __delattr__ of class. they report the changes of the watched instances only -
+    other instances pay one dict lookup.
+    """
 
+    def __init__(self, cls: type):
+        """
         Raises:
-            DependencyMissing - watchpoints.
+            TypeError: the class is C type (can not be changed)
+        """
+        self.cls = cls
+        self.saved = {name: cls.__dict__[name] for name in ("__setattr__", "__delattr__") if name in cls.__dict__}
+        self.instances = {}
+        """ id(instance) -> InterceptElement list """
+        instances = self.instances
+        original_setattr = cls.__setattr__
+        original_delattr = cls.__delattr__
+
+        def __setattr__(obj, name, value):
+            elements = instances.get(id(obj))
+            if not elements:
+                return original_setattr(obj, name, value)
+            prev = getattr(obj, name, _DELETED)
+            original_setattr(obj, name, value)
+            frame = sys._getframe(1)  # noqa
+            for elem in elements:
+                elem.changed(name, prev, getattr(obj, name, _DELETED), frame)
+
+        def __delattr__(obj, name):
+            elements = instances.get(id(obj))
+            if not elements:
+                return original_delattr(obj, name)
+            prev = getattr(obj, name, _DELETED)
+            original_delattr(obj, name)
+            frame = sys._getframe(1)  # noqa
+            for elem in elements:
+                elem.changed(name, prev, _DELETED, frame)
+
+        cls.__setattr__ = __setattr__
+        cls.__delattr__ = __delattr__
+
+    def add(self, elem: InterceptElement):
+        self.instances.setdefault(id(elem.instance), []).append(elem)
+
+    def remove(self, args: tuple):
+        """
+        remove the elements that belong to args (all the elements if args is empty)
+        """
+        for key, elements in list(self.instances.items()):
+            elements = [elem for elem in elements if args and not any(elem.same(arg) for arg in args)]
+            if elements:
+                self.instances[key] = elements
+            else:
+                del self.instances[key]
+
+    def restore(self):
+        """put back the original __setattr__ and __delattr__"""
+        for name in ("__setattr__", "__delattr__"):
+            if name in self.saved:
+                setattr(self.cls, name, self.saved[name])
+            else:
+                delattr(self.cls, name)
+
+
+class Watcher:
+    """
+    watch engine for dd.watch with lower overhead than watchpoints: only frames of code objects that can change the
+    watched values (the watching frame, closures and code that use the variable/attribute name) are checked.
+    on python 3.12+ it use sys.monitoring (other code run without any trace event), else sys.settrace.
+    changes made in other frames (e.g. by function that got the object as argument) are reported at the next line of
+    checked frame.
+    """
+
+    def __init__(self):
+        self.watch_list: List[WatchElement] = []
+        self.enable = False
+        self._lock = threading.RLock()
+        self._matches = {}
+        """ code -> should be checked """
+        self._last_lines = {}
+        """ frame -> last line number """
+        self._old_trace = None
+        self._old_thread_trace = None
+        self._tool = None
+        self._monitored_codes = set()
+        self._local = threading.local()
+        self._patches = {}
+        """ class -> _ClassPatch of dd.watch(..., intercept=True) """
+
+    def __call__(self, *args, **kwargs):
+        """
+        watch the arguments (variables, attributes, items or objects) and report every change.
+        with intercept=True instances and their attributes are watched by replacing __setattr__/__delattr__ of
+        the class (without tracing). unknown options are passed to watchpoints.
+        """
+        frame = sys._getframe(1)  # noqa
+        node = None
+        intercept = kwargs.pop("intercept", False)
+        if kwargs.keys() <= _OPTIONS:
+            import executing
+
+            node = executing.Source.executing(frame).node
+        if not isinstance(node, ast.Call) or len(node.args) != len(args) or \
+                any(isinstance(arg, ast.Starred) for arg in node.args):
+            _watchpoints_call(frame, kwargs)
+            del frame
+            return
+        with self._lock:
+            elements = [WatchElement(frame, arg_node, value, **kwargs) for arg_node, value in zip(node.args, args)
+                        if not (intercept and self._intercept(frame, arg_node, value, kwargs))]
+            if not elements:
+                del frame
+                return
+            self.watch_list.extend(elements)
+            self._matches.clear()
+            self._last_lines.setdefault(frame, frame.f_lineno)
+            if self.enable:
+                self._watch_frames(frame)
+            else:
+                self._start(frame)
+        del frame
+
+    def unwatch(self, *args):
+        """
+        stop watching the arguments (objects or aliases), or everything if there are no arguments
+        """
+        with self._lock:
+            if args:
+                self.watch_list = [elem for elem in self.watch_list if not any(elem.same(arg) for arg in args)]
+            else:
+                self.watch_list = []
+            for patch in list(self._patches.values()):
+                patch.remove(args)
+                if not patch.instances:
+                    patch.restore()
+                    del self._patches[patch.cls]
+            self._matches.clear()
+            if not self.watch_list:
+                self._stop()
+        if _watch is not None:
+            _watch.unwatch(*args)
+
+    def _intercept(self, frame: FrameType, node: ast.expr, value, options: dict) -> bool:
+        """
+        watch by replacing __setattr__/__delattr__ of the class - for instance (`obj`) or its attribute (`obj.attr`)
+
+        Returns:
+            bool: False if it is not possible (item, object without __dict__ or C type)
+        """
+        if isinstance(node, ast.Attribute):
+            instance, attr = _eval(node.value, frame), node.attr
+        elif isinstance(node, ast.Subscript):
+            return False
+        else:
+            instance, attr = value, None
+        if not hasattr(instance, "__dict__") or isinstance(instance, type):
+            return False
+        cls = type(instance)
+        patch = self._patches.get(cls)
+        if patch is None:
+            try:
+                patch = _ClassPatch(cls)
+            except TypeError:  # C type
+                return False
+            self._patches[cls] = patch
+        options = {name: options[name] for name in ("alias", "callback", "when", "cmp", "file") if name in options}
+        patch.add(InterceptElement(instance, attr, _source_text(frame, node), **options))
+        return True
+
+    def _match(self, code) -> bool:
+        matches = self._matches.get(code)
+        if matches is None:
+            matches = self._matches[code] = any(elem.matches(code) for elem in self.watch_list)
+        return matches
+
+    def _check(self, frame, lineno: int):
+        """
+        check the watch list after line (lineno) of frame
+        """
+        code = frame.f_code
+        exec_info = (code.co_name, code.co_filename, lineno)
+        for elem in self.watch_list:
+            if elem.changed():
+                if not elem.when or elem.when(elem.obj):
+                    if elem.callback:
+                        elem.callback(frame, elem, exec_info)
+                    else:
+                        report(elem, exec_info, (lambda message: _stream_print(message, elem.file))
+                               if elem.file is not None else None)
+                elem.update()
+
+    def _line(self, frame, lineno: int):
+        with self._lock:
+            self._check(frame, self._last_lines.get(frame, lineno))
+            self._last_lines[frame] = lineno
+
+    def _return(self, frame):
+        with self._lock:
+            self._check(frame, self._last_lines.pop(frame, frame.f_lineno))
+            self._frame_done(frame)
+
+    def _frame_done(self, frame):
+        """
+        frame ended - remove its local variables from the watch list
+        """
+        self._last_lines.pop(frame, None)
+        if not any(elem.frame is frame for elem in self.watch_list):
+            return
+        self.watch_list = [elem for elem in self.watch_list if elem.frame is not frame or elem.local_name is None]
+        for elem in self.watch_list:
+            if elem.frame is frame:
+                elem.frame = None
+        self._matches.clear()
+        if not self.watch_list:
+            self._stop()
+
+    def _running_frames(self, frame):
+        while frame is not None:
+            if self._match(frame.f_code):
+                yield frame
+            frame = frame.f_back
+
+    def _start(self, frame):
+        self.enable = True
+        if sys.version_info >= (3, 12) and self._start_monitoring(frame):
+            return
+        self._old_trace = sys.gettrace()
+        self._old_thread_trace = threading._trace_hook  # noqa - threading.gettrace is python 3.10+
+        self._watch_frames(frame)
+        sys.settrace(self._global_trace)
+        threading.settrace(self._global_trace)
+
+    def _watch_frames(self, frame):
         """
-        raise DependencyMissing("watchpoints")
+        check the running frames that match (the watching frame and its callers)
+        """
+        for running in self._running_frames(frame):
+            self._last_lines.setdefault(running, running.f_lineno)
+            if self._tool is not None:
+                self._monitor_code(running.f_code)
+            else:
+                running.f_trace = self._local_trace
+        if self._tool is not None:
+            sys.monitoring.restart_events()
+
+    def _stop(self):
+        if not self.enable:
+            return
+        self.enable = False
+        self._last_lines.clear()
+        if self._tool is not None:
+            self._stop_monitoring()
+            return
+        frame = sys._getframe(1)  # noqa
+        while frame is not None:
+            if frame.f_trace == self._local_trace:
+                frame.f_trace = None
+            frame = frame.f_back
+        sys.settrace(self._old_trace)
+        threading.settrace(self._old_thread_trace)
+        self._old_trace = self._old_thread_trace = None
+
+    # sys.settrace engine (python < 3.12)
+
+    def _global_trace(self, frame, event, _arg):
+        if event == "call" and self._match(frame.f_code):
+            return self._local_trace
+        return None
+
+    def _local_trace(self, frame, event, _arg):
+        if event == "line":
+            self._line(frame, frame.f_lineno)
+        elif event == "return":
+            self._return(frame)
+        return self._local_trace
+
+    # sys.monitoring engine (python 3.12+)
+
+    def _start_monitoring(self, frame) -> bool:
+        monitoring = sys.monitoring
+        events = monitoring.events
+        tool = next((tool for tool in range(6) if monitoring.get_tool(tool) is None), None)
+        if tool is None:
+            return False
+        monitoring.use_tool_id(tool, "ddebug")
+        self._tool = tool
+        monitoring.register_callback(tool, events.PY_START, self._monitor_start)
+        monitoring.register_callback(tool, events.LINE, self._monitor_line)
+        monitoring.register_callback(tool, events.PY_RETURN, self._monitor_return)
+        monitoring.register_callback(tool, events.PY_UNWIND, self._monitor_unwind)
+        monitoring.set_events(tool, events.PY_START | events.PY_UNWIND)
+        self._watch_frames(frame)
+        return True
+
+    def _stop_monitoring(self):
+        monitoring = sys.monitoring
+        tool, self._tool = self._tool, None
+        monitoring.set_events(tool, 0)
+        for code in self._monitored_codes:
+            monitoring.set_local_events(tool, code, 0)
+        self._monitored_codes.clear()
+        for event in (monitoring.events.PY_START, monitoring.events.LINE, monitoring.events.PY_RETURN,
+                      monitoring.events.PY_UNWIND):
+            monitoring.register_callback(tool, event, None)
+        monitoring.free_tool_id(tool)
+
+    def _monitor_code(self, code):
+        if code not in self._monitored_codes:
+            self._monitored_codes.add(code)
+            sys.monitoring.set_local_events(self._tool, code,
+                                            sys.monitoring.events.LINE | sys.monitoring.events.PY_RETURN)
+
+    def _monitor_start(self, code, _offset):
+        if self._tool is not None and self._match(code):
+            self._monitor_code(code)
+        return sys.monitoring.DISABLE
+
+    def _monitor_event(self, handler: Callable, *args):
+        if getattr(self._local, "busy", False) or self._tool is None:  # events of __eq__ or copy in the check
+            return
+        self._local.busy = True
+        try:
+            handler(sys._getframe(2), *args)  # noqa
+        finally:
+            self._local.busy = False
+
+    def _monitor_line(self, _code, lineno: int):
+        self._monitor_event(self._line, lineno)
+
+    def _monitor_return(self, _code, _offset, _value):
+        self._monitor_event(self._return)
+
+    def _monitor_unwind(self, _code, _offset, _exception):
+        if self._last_lines:
+            self._monitor_event(self._unwind)
+
+    def _unwind(self, frame):
+        with self._lock:
+            self._frame_done(frame)
+
+
+def _watchpoints_call(frame: FrameType, kwargs: dict):
+    """
+    watchpoints.watch(...) for the arguments of the dd.watch call in frame (like `Watch.__call__`)
+    """
+    watch = get_watch()
+    watch_module = importlib.import_module("watchpoints.watch")
+    with watch.set_lock:
+        for node, name in watch_module.getargnodes(frame):
+            watch.watch_list.append(watch_module.WatchElement(
+                frame, node, alias=kwargs.get("alias", None), default_alias=name,
+                callback=kwargs.get("callback", None), track=kwargs.get("track", ["variable", "object"]),
+                when=kwargs.get("when", None), deepcopy=kwargs.get("deepcopy", False), cmp=kwargs.get("cmp", None),
+                copy=kwargs.get("copy", None),
+                watch_print=watch_module.WatchPrint(file=kwargs.get("file", watch.file),
+                                                    stack_limit=kwargs.get("stack_limit", watch.stack_limit),
+                                                    custom_printer=kwargs.get("custom_printer",
+                                                                              watch.custom_printer))))
+        if not watch.enable and watch.watch_list:
+            watch.start_trace(frame)
+
+
+_watcher = None
+
+
+def get_watcher() -> Watcher:
+    """
+    get the ddebug watch engine (dd.watch)
+    """
+    global _watcher
+    if _watcher is None:
+        _watcher = Watcher()
+    return _watcher
+
+
+def get_watch():
+    """
+    get watchpoints.watch. watchpoints is imported (and `WatchPrint` replaced by `WatchCallBack`) on the first call.
+
+    Raises:
+        DependencyMissing - watchpoints.
+    """
+    global _watch
+    if _watch is None:
+        try:
+            import watchpoints
+        except ImportError:
+            raise DependencyMissing("watchpoints")
+        # replace `WatchPrint` by `WatchCallBack`.
+        # watchpoints.watch.config() # TODO
+        importlib.import_module("watchpoints.watch").WatchPrint = _watch_callback_class()
+        watchpoints.watch.file = file
+        _watch = watchpoints.watch
+    return _watch
 
 
-    watch.unwatch = watch
-    enable = False
+def set_file(value):
+    """
+    set the watch output stream
+    """
+    global file
+    file = value
+    if _watch is not None:
+        _watch.file = value
 
 
 def main():
     class X:
         pass
 
+    watch = get_watch()
     a = "prev_a"
     b = "prev_b"
     x = X()
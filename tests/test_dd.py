@@ -1,9 +1,23 @@
+import asyncio
+import collections
+import gzip
+import inspect
 import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import types
 
 import cheap_repr
 
-from ddebug import dd
-from ddebug.dd_util import ansi_escape
+from ddebug import dd, flightlib, limitlib, replay, sourcelib, tracelib
+from ddebug.dd_util import AsyncWriter, Logger, LRUCache, Rendered, RotatingFile, ThreadFiles, ansi_escape, strip_ansi
+from ddebug.timelib import TimeitHistory, TimeitRegression, TimeitResult
 
 dd.rich_color_system = None
 
@@ -46,6 +60,51 @@ class TestDD:
                 assert b == a, "dd not return the value"
             # assert (map(lambda x:x.startswith("dd |"),tmp.getvalue().split("\n")))
 
+    def test_dd_limit_reprs(self):
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            big = list(range(10 ** 6))
+            dd(big)
+            assert tmp.getvalue().strip().endswith("99, ...] (len=1000000)")
+            data = b"y" * 5000
+            dd(data)
+            assert "bytes(len=5000, head=b'yyy" in tmp.getvalue()
+            small = {"b": [1, 2], "a": "text"}
+            dd(small)
+            assert tmp.getvalue().strip().endswith("dd| small: {'a': 'text', 'b': [1, 2]}")  # pformat as before
+            tmp.truncate(0)
+            tmp.seek(0)
+            medium = {f"key{i:02}": [i] * 3 for i in range(60, 0, -1)}  # within the limits - sorted and wrapped
+            dd(medium)
+            assert tmp.getvalue().strip().split("\n")[:2] == ["dd| medium: {'key01': [1, 1, 1],",
+                                                              "             'key02': [2, 2, 2],"]
+            tmp.truncate(0)
+            tmp.seek(0)
+            counts = collections.Counter("abca")
+            factory = collections.defaultdict(list, a=[1])
+            dd(counts)  # small stdlib containers keep their own repr
+            dd(factory)
+            assert tmp.getvalue().strip().split("\n") == ["dd| counts: Counter({'a': 2, 'b': 1, 'c': 1})",
+                                                         "dd| factory: defaultdict(<class 'list'>, {'a': [1]})"]
+
+            tmp.truncate(0)
+            tmp.seek(0)
+            dd.limit_reprs(max_items=3, max_string=10, max_depth=2)
+            try:
+                mapping = collections.OrderedDict((i, i) for i in range(10))
+                dd(mapping)
+                text = "x" * 100
+                dd(text)
+                nested = [[[1]]]
+                dd(nested)
+            finally:
+                dd.limit_reprs()
+            assert tmp.getvalue().strip().split("\n") == [
+                "dd| mapping: OrderedDict({0: 0, 1: 1, 2: 2, ... (10 items)})",
+                "dd| text: 'xxxxx'...'xxxxx' (len=100)",
+                "dd| nested: [[[...]]]"]
+            dd.stream = sys.stderr
+
     def test_dd_enabled(self):
         with io.StringIO() as tmp:
             dd.stream = tmp
@@ -69,6 +128,363 @@ class TestDD:
             dd.inspect(a)
             dd.enabled = True
             assert tmp.getvalue() == '', f"\"{tmp.getvalue()}\" is not empty"
+            foo()  # decorated while disabled - traced after dd is enabled again
+            assert ">>> call to" in _remove_ansi(tmp.getvalue()).lower()
+
+    def test_dd_disabled_overhead(self):
+        def bare(*args):
+            return args[0] if len(args) == 1 else args
+
+        def best(stmt):
+            return min(timeit.repeat(stmt, number=20000, repeat=5))
+
+        dd.enabled = False
+        try:
+            x = 1
+            bare_time = best(lambda: bare(x))
+            call_time = best(lambda: dd(x))
+            operator_time = best(lambda: dd + x)
+        finally:
+            dd.enabled = True
+        # a disabled dd() must cost about as much as a bare function call (no frame inspection or source reads)
+        assert call_time < bare_time * 10, (call_time, bare_time)
+        assert operator_time < bare_time * 10, (operator_time, bare_time)
+
+    def test_dd_call_site_cache(self):
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            dd.call_sites.clear()
+            for i in range(5):
+                dd(i)
+            info = dd.call_sites.cache_info()
+            assert info.misses == 1
+            assert info.hits == 4
+            assert info.currsize == 1
+            lines = tmp.getvalue().strip().split("\n")
+            assert lines == [f"dd| i: {i}" for i in range(5)]
+
+            maxsize = dd.call_sites.maxsize
+            dd.call_sites.maxsize = 1
+            try:
+                dd(1)
+                dd(2)
+            finally:
+                dd.call_sites.maxsize = maxsize
+            assert dd.call_sites.cache_info().evictions >= 1
+
+        class EvictedMeanwhile(collections.OrderedDict):  # other thread evicts the key in the middle of get
+            def __getitem__(self, key):
+                value = super().__getitem__(key)
+                del self[key]
+                return value
+
+        cache = LRUCache(2)
+        cache._data = EvictedMeanwhile(key="value")
+        assert cache.get("key") == "value" and cache.get("key") is None
+
+    def test_dd_async_writer(self):
+        with io.StringIO() as tmp:
+            writer = AsyncWriter(tmp)
+            dd.stream = writer
+            for i in range(50):
+                dd(i)
+            writer.join()
+            assert tmp.getvalue().strip().split("\n") == [f"dd| i: {i}" for i in range(50)]
+            dd.stream = tmp
+            writer.close()
+            assert writer.closed
+            writer.write("after close\n")  # the stream closed too - dropped, no error
+            assert writer.dropped == 1
+
+        lines = []
+        writer = AsyncWriter(types.SimpleNamespace(write=lines.append))
+        writer.close()
+        writer.write("written directly\n")
+        assert lines == ["written directly\n"]
+
+        class SlowStream(io.StringIO):
+            release = threading.Event()
+
+            def write(self, s):
+                self.release.wait()
+                return super().write(s)
+
+        slow = SlowStream()
+        writer = AsyncWriter(slow, max_queue=1, overflow="drop")
+        for i in range(10):
+            writer.write(f"{i}\n")
+        SlowStream.release.set()
+        writer.join()
+        assert writer.dropped >= 8
+        assert slow.getvalue().startswith("0\n")
+
+    def test_strip_ansi(self):
+        plain = "dd| x: [1, 2, 3], y: 'some text' " * 4
+        colored = f"\x1b[31m{plain}\x1b[0m"
+        assert strip_ansi(plain) is plain
+        assert strip_ansi(colored) == plain
+        assert strip_ansi(Rendered(colored, plain)) is plain
+        assert strip_ansi("\x9b31mé") == "é"
+
+        def best(stmt):
+            return min(timeit.repeat(stmt, number=20000, repeat=5))
+
+        trace = sys.gettrace()  # dd.watch of other tests may be still on
+        sys.settrace(None)
+        try:
+            # microbenchmark: the no-escape path skip the regex, and the Rendered path skip it too
+            regex_time = best(lambda: ansi_escape.sub('', plain))
+            assert best(lambda: strip_ansi(plain)) < regex_time
+            rendered = Rendered(colored, plain)
+            assert best(lambda: strip_ansi(rendered)) < best(lambda: ansi_escape.sub('', colored))
+        finally:
+            sys.settrace(trace)
+
+    def test_dd_tag_records(self):
+        def worker(n):
+            for i in range(n):
+                dd(i)
+
+        with io.StringIO() as tmp, tempfile.TemporaryDirectory() as folder:
+            stream = ThreadFiles(os.path.join(folder, "{thread}.txt"), Logger(io.StringIO(), tmp))
+            dd.stream = stream
+            dd.tag_records = True
+            try:
+                threads = [threading.Thread(target=worker, args=(100,), name=f"worker{j}") for j in range(4)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                async def task():
+                    dd("in task")
+
+                asyncio.run(task())
+            finally:
+                dd.tag_records = False
+                dd.stream = sys.stderr
+            lines = tmp.getvalue().strip().split("\n")
+            assert len(lines) == 401
+            assert all(line.startswith(("[worker", "[MainThread/Task-")) and "dd| " in line for line in lines)
+            with open(os.path.join(folder, "worker2.txt")) as f:
+                assert f.read().strip().split("\n") == [f"[worker2] dd| i: {i}" for i in range(100)]
+            assert len(stream._files) == 1  # the files of the ended threads are closed - only MainThread is open
+            stream.close()
+
+    def test_rotating_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join(folder, "log.txt")
+            with open(file, "w") as f:
+                f.write("previous run\n")
+            log = RotatingFile(file, max_bytes=100, backup_count=3, compress=True)
+            for i in range(40):
+                log.write(f"line {i:02}\n")  # 8 characters
+            log.close()
+            segments = log.segments()
+            assert len(segments) == 3
+            assert all(segment.endswith(".txt.gz") for segment in segments)
+            with gzip.open(segments[-1], "rt") as f:
+                assert f.read().startswith("line 24\n")
+            with open(file) as f:
+                assert f.read() == "".join(f"line {i:02}\n" for i in range(36, 40))
+
+    def test_source_cache(self):
+        import rich.console
+        import rich.syntax
+
+        cache = sourcelib.SourceCache()
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join(folder, "module.py")
+            with open(file, "w") as f:
+                f.write("def f(x):\n    return x\n")
+            source = cache.get(file)
+            assert cache.get(file) is source
+            assert source.line(2) == "    return x"
+            with open(file, "a") as f:
+                f.write("y = f(1)\n")
+            assert cache.get(file) is not source and cache.line(file, 3) == "y = f(1)"
+            assert cache.by_code(source.code) is None
+
+        code = sourcelib.source_cache.get(__file__).code
+        rendered = []
+        for syntax_class in (rich.syntax.Syntax, sourcelib.CachedSyntax):
+            console = rich.console.Console(file=io.StringIO(), width=100, color_system="truecolor")
+            console.print(syntax_class(code, "python", line_numbers=True, line_range=(40, 46), highlight_lines={43}))
+            rendered.append(console.file.getvalue())
+        assert rendered[0] == rendered[1]
+
+        import rich.traceback
+
+        try:
+            [][1]  # noqa
+        except IndexError as e:
+            error = e
+        sourcelib.cache_exception(error)
+        rendered = []
+        for traceback_class in (rich.traceback.Traceback, sourcelib.traceback_class()):
+            console = rich.console.Console(file=io.StringIO(), width=100, color_system="truecolor")
+            console.print(traceback_class.from_exception(type(error), error, error.__traceback__))
+            rendered.append(console.file.getvalue())
+        assert rendered[0] == rendered[1] and "[][1]" in _remove_ansi(rendered[1])
+        assert sourcelib.traceback_class() is not rich.traceback.Traceback
+        assert rich.traceback.Syntax is rich.syntax.Syntax  # rich itself is not changed
+
+    def test_dd_sample(self):
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            dd.sample(every=10)
+            try:
+                for i in range(100):
+                    dd(i)
+                summary = dd.sampler.summary()
+            finally:
+                dd.sample()
+            assert tmp.getvalue().strip().split("\n") == [f"dd| i: {i}" for i in range(0, 100, 10)]
+            assert "suppressed 90 outputs" in summary
+            assert dd.sampler is None
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            dd.sample(per_second=3)
+            try:
+                for i in range(100):
+                    dd(i)
+            finally:
+                dd.sample()
+            assert len(tmp.getvalue().strip().split("\n")) <= 6
+
+    def test_dd_stats(self):
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            dd.collect_stats()
+            try:
+                for i in range(10):
+                    dd(i, "text")
+            finally:
+                dd.collect_stats(False)
+            assert tmp.getvalue() == ""
+            dd.collect_stats()
+            try:
+                for i in range(1, 4):
+                    dd(i * 1.5)
+                dd.stats()
+            finally:
+                dd.collect_stats(False)
+            value = _remove_ansi(tmp.getvalue())
+            assert "dd.stats" in value
+            assert "i * 1.5" in value
+            assert "test_dd.py" in value
+            assert "4.5" in value
+            assert "3" in value
+
+    def test_dd_import_time(self):
+        heavy = ("icecream", "snoop", "rich.console", "friendly_traceback", "deepdiff", "watchpoints")
+        code = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import ddebug\n"
+            "lazy_time = time.perf_counter() - start\n"
+            "enabled = [ddebug.dd.enabled]\n"  # reading and setting dd.enabled do not create the outputs
+            "ddebug.dd.enabled = False\n"
+            "enabled.append(ddebug.dd.enabled)\n"
+            "ddebug.dd.enabled = True\n"
+            "assert enabled == [True, False], enabled\n"
+            "ddebug.dd.enabled = False\n"  # disabled dd() and operators do not create the outputs
+            "ddebug.dd(1)\n"
+            "ddebug.dd + 1\n"
+            "ddebug.dd.enabled = True\n"
+            f"loaded = [name for name in {heavy!r} if name in sys.modules]\n"
+            "start = time.perf_counter()\n"
+            f"for name in {heavy!r}: __import__(name)\n"
+            "heavy_time = time.perf_counter() - start\n"
+            "print(json.dumps([loaded, lazy_time, heavy_time]))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run([sys.executable, "-c", "import json\n" + code], cwd=root, capture_output=True, text=True,
+                             check=True).stdout
+        loaded, lazy_time, heavy_time = json.loads(out)
+        assert loaded == [], f"{loaded} imported by `import ddebug`"
+        # `import ddebug` must cost less than the dependencies it defers
+        assert lazy_time < heavy_time, (lazy_time, heavy_time)
+
+    def test_dd_profile(self):
+        def busy():
+            total = 0
+            for i in range(200000):
+                total += i * i
+            return total
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+
+            @dd.profile(interval=0.001)
+            def run():
+                for _ in range(5):
+                    busy()
+
+            run()
+            value = _remove_ansi(tmp.getvalue())
+            assert "@dd.profile on" in value
+            assert "run" in value
+
+        with tempfile.TemporaryDirectory() as folder, io.StringIO() as tmp:
+            dd.stream = tmp
+            collapsed_file = os.path.join(folder, "stacks.txt")
+            profile = dd.profile(collapsed_file=collapsed_file)
+            with profile:
+                for _ in range(5):
+                    busy()
+            assert profile.last.samples > 0
+            with open(collapsed_file) as f:
+                lines = f.read().strip().split("\n")
+            assert all(line.startswith("test_dd_profile (test_dd.py:") for line in lines)
+            assert any("busy (test_dd.py:" in line for line in lines)
+            assert "busy" in _remove_ansi(tmp.getvalue())
+
+        first_started, second_started, first_done = threading.Event(), threading.Event(), threading.Event()
+
+        @dd.profile  # the same Profile object in both threads
+        def first():
+            first_started.set()
+            second_started.wait()
+            busy()
+
+        @dd.profile
+        def second():
+            second_started.set()
+            while not first_done.is_set():
+                busy()
+
+        def run_first():
+            first()
+            first_done.set()
+
+        def run_second():
+            first_started.wait()  # first stops while the later sampler of second runs
+            second()
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            threads = [threading.Thread(target=run_first), threading.Thread(target=run_second)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            reports = {report.split(":")[0]: report for report in _remove_ansi(tmp.getvalue()).split("@dd.profile on ")}
+            assert "second" not in reports["TestDD.test_dd_profile.<locals>.first"]  # every call has its own sampler
+            assert "first" not in reports["TestDD.test_dd_profile.<locals>.second"]
+
+            tmp.truncate(0)
+            tmp.seek(0)
+            profile = dd.profile()
+            dd.enabled = False
+            try:
+                with profile:
+                    busy()
+            finally:
+                dd.enabled = True
+            assert tmp.getvalue() == "" and profile.last is None  # not sampled
+            dd.stream = sys.stderr
 
     def test_dd_watch(self):
         with io.StringIO() as tmp:
@@ -80,6 +496,70 @@ class TestDD:
             a += 1
             assert tmp.getvalue().count("Watch trigger") == 3
 
+    def test_dd_watch_scoped(self):
+        class X:
+            pass
+
+        def append(items):
+            items.append(2)
+
+        def set_attribute(obj):
+            obj.value = 2
+
+        def untouched():
+            return sum(range(10))
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            x = X()
+            x.value = 1
+            b = [1]
+            dd.w(b, x.value)
+            assert sys.gettrace() is not None or sys.version_info >= (3, 12)
+            append(b)
+            set_attribute(x)
+            untouched()
+            dd.unw()
+            assert sys.gettrace() is None
+            output = tmp.getvalue()
+        assert "b:was [1] is now [1, 2]" in output
+        assert "x.value:was 1 is now 2" in output
+        assert "in set_attribute" in output
+        assert output.count("Watch trigger") == 2
+
+    def test_dd_watch_intercept(self):
+        class X:
+            def __init__(self):
+                self.value = 1
+
+            def bump(self):
+                self.value += 1
+
+        class Slots:
+            __slots__ = ("value",)
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            x, other = X(), X()
+            slots = Slots()
+            slots.value = 1
+            dd.w(x, intercept=True)
+            assert sys.gettrace() is None
+            x.bump()
+            other.bump()
+            del x.value
+            dd.w(slots.value, intercept=True)  # no __dict__ - traced
+            slots.value = 2
+            dd.unw()
+            x.value = 5
+            output = tmp.getvalue()
+        assert "__setattr__" not in X.__dict__
+        assert "x.value:was 1 is now 2" in output
+        assert "x.value:was 2 is now <deleted>" in output
+        assert "in bump" in output
+        assert "slots.value:was 1 is now 2" in output
+        assert output.count("Watch trigger") == 3
+
     def test_dd_rich(self):
         with io.StringIO() as tmp:
             dd.stream = tmp
@@ -109,6 +589,59 @@ class TestDD:
             assert "b = 70" in value
             assert "dd.locals" in value
 
+    def test_dd_locals_bounded(self):
+        class Record:
+            def __init__(self):
+                self.rows = list(range(10 ** 6))
+                self.name = "record"
+
+            def save(self):
+                pass
+
+        Record.save.__doc__ = "write the record " + "and its rows " * 20
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            user_rows = list(range(10 ** 6))
+            user_id = 7
+            other = Record()
+            dd.locals(include="user_*")
+            dd.inspect(other, include=["rows", "name"])
+            dd.inspect(other, include="save", methods=True)
+            dd.inspect(inspect, include="getdoc", methods=True)
+            value = _remove_ansi(tmp.getvalue())
+            dd.stream = sys.stderr
+        assert "(len=1000000)" in value and "user_id = 7" in value
+        assert "other = " not in value
+        assert "rows = [0, 1, 2" in value and "name = 'record'" in value
+        assert "def save(): write the record and its rows" in value and "row..." in value
+        assert "getdoc = def getdoc" in value and "getsource" not in value
+
+        limits = limitlib.LimitedRepr(max_items=1000, time_budget=0.00001)
+        nested = [list(range(1000)) for _ in range(1000)]
+        assert limits.format(nested) == "<list - repr stopped after 0.01 ms>"
+
+        class Huge:
+            def __repr__(self):
+                return "h" * 5000
+
+        class Slow:
+            def __repr__(self):
+                time.sleep(0.02)
+                return "s" * 5000
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            huge = Huge()
+            dd.locals(include="huge")
+            dd(huge)
+            value = _remove_ansi(tmp.getvalue())
+            dd.stream = sys.stderr
+        assert "h" * 5000 not in value and "h" * 20 + "..." in value
+        limits = limitlib.LimitedRepr(max_string=80, time_budget=0.005)
+        assert limits.format(Slow()) == "<Slow - repr stopped after 5 ms>"
+        assert limits.format([Slow()]) == "<list - repr stopped after 5 ms>"
+
     def test_dd_snoop(self):
         with io.StringIO() as tmp:
             dd.stream = tmp
@@ -153,6 +686,169 @@ class TestDD:
             assert "a" in value
             assert "$$$" in value
 
+    def test_dd_record_trace(self):
+        with tempfile.TemporaryDirectory() as folder:
+            trace_file = os.path.join(folder, "trace.ddt")
+            dd.record_trace(trace_file)
+            try:
+                @dd
+                def foo(n):
+                    x = [n]
+                    x.append(1)
+                    return n + 333
+
+                assert foo(123) == 456
+                with dd:
+                    y = 5
+            finally:
+                dd.record_trace(None)
+
+            lines = []
+            replay.render(tracelib.read_trace(trace_file), lines.append)
+            value = "\n".join(lines)
+            assert ">>> Call to foo" in value
+            assert "n = 123" in value
+            assert "x = [123, 1]" in value
+            assert "x.append(1)" in value
+            assert "<<< Return value from foo: 456" in value
+            assert ">>> Enter with block in test_dd_record_trace" in value
+            assert "y = 5" in value
+            assert "<<< Exit with block" in value
+
+        with tempfile.TemporaryDirectory() as folder:
+            trace_file = os.path.join(folder, "threads.ddt")
+            recorder = tracelib.TraceRecorder(trace_file)
+            functions = [recorder(eval("lambda n: n + 1")) for _ in range(20)]  # new code objects
+
+            def worker():
+                for function in functions:
+                    function(1)
+
+            threads = [threading.Thread(target=worker, name=f"worker{j}") for j in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            recorder.close()
+            events = list(tracelib.read_trace(trace_file))  # every code record is before its events
+            assert len(events) == 8 * 20 * 3
+            assert {event.thread for event in events} == {f"worker{j}" for j in range(8)}
+            lines = []
+            replay.render(events, lines.append)
+            assert sum(" --- thread worker" in line for line in lines) >= 1
+
+        with tempfile.TemporaryDirectory() as folder:
+            trace_file = os.path.join(folder, "with.ddt")
+            dd.record_trace(trace_file)
+            entered, first_exited = threading.Barrier(2), threading.Event()
+
+            def first():
+                with dd:
+                    entered.wait()
+                first_exited.set()
+
+            def second():
+                with dd:
+                    entered.wait()
+                    first_exited.wait()
+                    after = 2  # noqa - traced after the other thread left its `with` block
+
+            threads = [threading.Thread(target=first, name="first"), threading.Thread(target=second, name="second")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            dd.record_trace(None)
+            events = list(tracelib.read_trace(trace_file))
+            assert [(event.thread, event.name) for event in events if event.kind == tracelib.EXIT] == [
+                ("first", "first"), ("second", "second")]
+            assert any(event.thread == "second" and ("after", "2") in event.variables for event in events)
+
+    def test_dd_json_output(self):
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join(folder, "events.jsonl")
+            dd.json_output(file)
+            try:
+                @dd
+                def foo(n):
+                    x = [n]
+                    return n + 333
+
+                assert foo(123) == 456
+                value = {"a": [1, 2]}
+                assert dd(value, 5) == (value, 5)
+                try:
+                    1 / 0
+                except ZeroDivisionError:
+                    dd.print_exception()
+            finally:
+                dd.json_output(None)
+            with open(file) as f:
+                events = [json.loads(line) for line in f]
+        snoop_events = [event["event"] for event in events if event["channel"] == "snoop"]
+        assert snoop_events == ["call", "line", "line", "return"]
+        assert events[3]["return"] == "456"
+        assert events[2]["variables"] == {"x": "[123]"}
+        call = events[4]
+        assert call["event"] == "dd" and call["function"] == "test_dd_json_output"
+        assert call["values"] == {"value": "{'a': [1, 2]}", "5": 5}
+        exception = events[5]
+        assert exception["type"] == "ZeroDivisionError"
+        assert exception["traceback"][-1]["line"] == exception["line"]
+
+        with tempfile.TemporaryDirectory() as folder:
+            dd.record_trace(os.path.join(folder, "trace.ddt"))
+            recorder = dd._trace_recorder
+            dd.json_output(os.path.join(folder, "events.jsonl"))  # replaces the binary recorder
+            dd.json_output(None)
+            assert recorder.file.closed and dd._trace_recorder is None
+
+    def test_dd_flight_recorder(self):
+        with tempfile.TemporaryDirectory() as folder, io.StringIO() as tmp:
+            dd.stream = tmp
+            file = os.path.join(folder, "flight.ddf")
+            dd.flight_recorder(size_mb=0.002, file=file)  # ~2KB - the buffer wraps around
+            try:
+                for i in range(500):
+                    dd(i)
+
+                @dd.mincls
+                class A:
+                    def foo(self):
+                        pass
+
+                A().foo()
+                recorder = dd._flight_recorder
+                events = flightlib.read_flight(file)
+                assert recorder.events() == events
+            finally:
+                dd.flight_recorder(None)
+            dd.stream = sys.stderr
+            assert tmp.getvalue() == ""  # recorded instead of printed
+        assert 10 < len(events) < 100
+        assert [event.message for event in events[-3:-1]] == ["i=498", "i=499"]
+        assert events[-1].kind == "mincls" and "'foo'" in events[-1].message
+        assert all(event.kind == "dd" for event in events[:-1])
+        assert "test_dd_flight_recorder" in events[0].location
+
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join(folder, "flight.ddf")
+            for run in range(4):  # a restarted program keeps the file of the previous run
+                recorder = flightlib.FlightRecorder(file, 4096, backup_count=2)
+                recorder.record("dd", "here", f"run {run}")
+                recorder.close()
+            previous = sorted(os.listdir(folder))
+            assert len(previous) == 3 and previous[-1] == "flight.ddf"
+            assert [flightlib.read_flight(os.path.join(folder, name))[0].message for name in previous] == [
+                "run 1", "run 2", "run 3"]
+
+            recorder = flightlib.FlightRecorder(file, 1024)
+            recorder.record("dd", "x" * 5000, "long location")  # the location is truncated like the message
+            recorder.record("dd", "here", "next")
+            recorder.close()
+            assert [(event.location, event.message) for event in flightlib.read_flight(file)] == [
+                ("x" * 64, "long location"), ("here", "next")]
+
     def test_ssc(self):
         with io.StringIO() as tmp:
             dd.stream = tmp
@@ -216,6 +912,77 @@ class TestDD:
                 assert "Friendly Explanation" in value
                 assert "dividing" in value
 
+    def test_dd_fast_exceptions(self):
+        @dd.log_error_function
+        def divide(x):
+            return 1 / x
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            dd.fast_exceptions()
+            try:
+                for _ in range(3):
+                    divide(0)
+                first, *_ = _remove_ansi(tmp.getvalue()).split("Traceback (most recent call last):")
+                assert first.count("Friendly Explanation") == 1
+                assert _remove_ansi(tmp.getvalue()).count("ZeroDivisionError: division by zero") == 3
+
+                tmp.seek(0)
+                tmp.truncate()
+                dd.fast_exceptions(background=True)
+                divide(None)
+                dd._console.join_exceptions()
+                value = _remove_ansi(tmp.getvalue())
+                assert value.index("TypeError: unsupported operand") < value.index("Friendly Explanation")
+            finally:
+                dd.fast_exceptions(False)
+
+    def test_dd_dedup_exceptions(self):
+        @dd.log_error_function
+        def parse(text):
+            return int(text)
+
+        with io.StringIO() as tmp, tempfile.TemporaryDirectory() as folder:
+            dd.stream = tmp
+            dd.dedup_exceptions()
+            dd.error_summary(clear=True)
+            try:
+                for i in range(100):
+                    parse(f"x{i}")
+                assert _remove_ansi(tmp.getvalue()).count("Traceback (most recent call last)") == 1
+                try:
+                    parse(None)  # other type
+                except TypeError:
+                    pass
+                assert _remove_ansi(tmp.getvalue()).count("Traceback (most recent call last)") == 2
+                dd.error_summary()
+                summary = _remove_ansi(tmp.getvalue()).split("dd.error_summary")[-1]
+                assert "ValueError" in summary and "100" in summary and "x0" in summary and "x2" in summary
+                assert "x3" not in summary
+
+                hook_file = os.path.join(folder, "script.py")
+                try:
+                    1 / 0
+                except ZeroDivisionError:
+                    dd._get_excepthook(file=hook_file)(*sys.exc_info())
+                with open(os.path.join(folder, "script-errors.txt")) as f:
+                    errors = _remove_ansi(f.read())
+                assert "ZeroDivisionError" in errors and "dd.error_summary" in errors and "ValueError" in errors
+            finally:
+                dd.dedup_exceptions(False)
+                dd.error_summary(clear=True)
+                dd.stream = sys.stderr
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            for text in ("x", "y"):
+                try:
+                    int(text)
+                except ValueError:
+                    dd.print_exception()
+            dd.stream = sys.stderr
+        assert dd._console.error_stats == {}  # not counted without dedup_exceptions or fast_exceptions
+
     def test_dd_stack(self):
         with io.StringIO() as tmp:
             dd.stream = tmp
@@ -240,6 +1007,34 @@ class TestDD:
                 assert l + "()" in value
                 assert "dd.print_stack" in value
 
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            before = 1  # noqa
+            dd.print_stack(block=1, context=3)
+            after = 2  # noqa
+            value = _remove_ansi(tmp.getvalue())
+        assert "before = 1" in value and "after = 2" in value
+        dd.stream = sys.stderr
+
+    def test_dd_stack_compact(self):
+        def recurse(n):
+            if n:
+                return recurse(n - 1)
+            dd.print_stack(block=3, compact=True)
+            start = timeit.default_timer()
+            dd.print_stack(compact=True)
+            return timeit.default_timer() - start
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            elapsed = recurse(500)
+            first, rest = _remove_ansi(tmp.getvalue()).split("ddStack", 2)[1:]
+        assert first.count("<locals>.recurse ") == 3
+        assert "test_dd.py:" in first
+        assert rest.count("<locals>.recurse ") == 501
+        assert "test_dd_stack_compact" in rest
+        assert elapsed < 2
+
     def test_mincls(self):
         with io.StringIO() as tmp:
             dd.stream = tmp
@@ -266,6 +1061,32 @@ class TestDD:
                 assert repr("X") in dd_out
                 assert "at " in dd_out
 
+    def test_mincls_light(self):
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+
+            @dd.mincls(light=True)
+            class X:
+                def a(self):
+                    return "a"
+
+                def b(self):
+                    return "b"
+
+            x = X()
+            assert x.a() == "a"
+            assert x.b() == "b"
+            assert tmp.getvalue() == ""
+            dd.dump_mincls()
+            lines = tmp.getvalue().strip().split("\n")
+            assert len(lines) == 2
+            for name, line in zip("ab", lines):
+                assert line.startswith("dd| test_dd.py:")
+                assert "in test_mincls_light()" in line
+                assert f"call method '{name}' from class 'X'" in line
+            dd.dump_mincls()
+            assert len(tmp.getvalue().strip().split("\n")) == 2
+
     def test_dd_color(self):
         with io.StringIO() as tmp:
             dd.stream = tmp
@@ -297,6 +1118,106 @@ class TestDD:
             assert "times" in value
             assert " add " in value
 
+    def test_dd_timeit_stats(self):
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+
+            @dd.timeit(number=1000, repeat=7)
+            def add(a, b):
+                return a + b
+
+            total = add(1, 2)
+            result = add.last_result
+            assert len(result.times) == 7
+            assert result.number == 1000
+            assert total == result.best * 1000
+            assert result.best <= result.median
+            assert result.ops_per_second > 0
+            value = _remove_ansi(tmp.getvalue())
+            assert "median" in value
+            assert "ops/s" in value
+            assert "7 x 1000 times" in value
+
+        with io.StringIO() as tmp:
+            dd.stream = tmp
+            results = dd.timeit_compare(sum, len, args=([1, 2, 3],), number=1000, repeat=3)
+            assert len(results) == 2
+            value = _remove_ansi(tmp.getvalue())
+            assert "dd.timeit_compare" in value
+            assert "sum" in value
+            assert "len" in value
+
+    def test_dd_timeit_history(self):
+        with tempfile.TemporaryDirectory() as folder, io.StringIO() as tmp:
+            dd.stream = tmp
+            history_file = os.path.join(folder, "history.jsonl")
+            history = TimeitHistory(history_file, threshold=0.1)
+            name = f"{__name__}.TestDD.test_dd_timeit_history.<locals>.add"
+            history.add(name, "v1", TimeitResult([1e-9], 1))  # impossible fast baseline
+
+            @dd.timeit(number=100, repeat=3, label="v1", history=history_file, raise_on_regression=True)
+            def add(a, b):
+                return a + b
+
+            try:
+                add(1, 2)
+            except TimeitRegression as e:
+                assert "vs baseline" in str(e)
+            else:
+                assert False, "TimeitRegression not raised"
+            assert "REGRESSION" in _remove_ansi(tmp.getvalue())
+            assert len(history.records(name, "v1")) == 2
+
+            @dd.timeit(number=100, repeat=3, label="v2", history=history_file)
+            def add(a, b):  # noqa
+                return a + b
+
+            add(1, 2)
+            add(1, 2)
+            assert len(history.records(name, "v2")) == 2
+            assert "baseline" in _remove_ansi(tmp.getvalue())
+
+    def test_timeit_outliers(self):
+        result = TimeitResult([1.0, 1.0, 1.1, 1.0, 0.9, 1.0, 5.0], 10)
+        assert result.outliers == [5.0]
+        assert result.best == 0.9
+        assert result == 9.0
+
+    def test_async(self):
+        s = io.StringIO()
+        dd.stream = s
+
+        @dd
+        async def coroutine(n):
+            x = n
+            await asyncio.sleep(0)
+            x += 1
+            return x
+
+        @dd
+        async def agen(n):
+            for i in range(n):
+                yield i
+                await asyncio.sleep(0)
+
+        @dd.timeit(number=5, repeat=2, print_result=False)
+        async def timed():
+            await asyncio.sleep(0)
+
+        async def main():
+            assert await coroutine(1) == 2
+            assert [i async for i in agen(2)] == [0, 1]
+            assert isinstance(await timed(), float)
+
+        asyncio.run(main())
+        dd.stream = sys.stderr
+        output = _remove_ansi(s.getvalue())
+        assert "x = 2" in output
+        assert output.count("<locals>.coroutine in File") == 2  # start and resume after the await
+        assert "StopIteration" not in output
+        assert timed.last_result.number == 5
+        assert timed.last_result.loop_lag is not None
+
 
 if __name__ == '__main__':
     import pytest